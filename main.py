@@ -1,18 +1,135 @@
+import argparse
+import atexit
+import multiprocessing
 import os
 import sys
+import time
 
 from PyQt6.QtGui import QIcon
 from PyQt6.QtWidgets import QApplication, QStyleFactory
 
 from package.consts.consts import APP_VERSION, APP_NAME, APP_NAME_LOWER
+from package.models.aggregates import format_summary
+from package.models.servermanager import ServerManager
+from package.network.capture import CaptureWriter, ReplayTransport
+from package.network.pushserver import PushServer
+from package.network.stream import RecordingTransport, set_transport
 from package.singleton.config import Config
+from package.utils.export import export_servers
 from package.ui.main_window import MainWindow
 from package.utils.utils import get_config_file_content
 
 basedir = os.path.dirname(__file__)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(prog=APP_NAME_LOWER)
+    parser.add_argument("--record", metavar="FILE", help="record all query packets to a capture file")
+    parser.add_argument("--replay", metavar="FILE", help="answer the queries from a capture file, without network")
+    parser.add_argument("--replay-speed", type=float, default=1.0, metavar="SPEED",
+                        help="divide the replayed response times by this factor, the refresh schedule doesn't change")
+    parser.add_argument("--headless", action="store_true",
+                        help="refresh the servers without the window, printing a summary of the server list")
+    parser.add_argument("--summary-interval", type=float, default=5.0, metavar="SECONDS",
+                        help="how often the summary is printed when headless")
+    parser.add_argument("--push-port", type=int, metavar="PORT",
+                        help="serve the server list changes as Server-Sent Events on http://127.0.0.1:PORT/events")
+    parser.add_argument("--export", metavar="FILE",
+                        help="refresh the servers and export them to a .jsonl, .csv or .parquet file, optionally "
+                             "compressed with a .gz or .zst suffix, without the window")
+    parser.add_argument("--export-wait", type=float, default=5.0, metavar="SECONDS",
+                        help="how long to wait for the servers to answer before exporting")
+    return parser.parse_known_args()[0]
+
+
+def create_server_manager(args) -> ServerManager:
+    """
+    Create the server manager, with the servers from the capture when replaying
+    :param args:  parsed command line arguments
+    :return:  ServerManager
+    """
+    # Query worker processes don't share the transport, so they are not used when recording or replaying
+    if args.record:
+        capture = CaptureWriter(args.record)
+        set_transport(RecordingTransport(capture))
+        atexit.register(capture.close)
+        return ServerManager.load()
+
+    if args.replay:
+        transport = ReplayTransport(args.replay, args.replay_speed)
+        set_transport(transport)
+        return ServerManager.from_addresses(transport.addresses())
+
+    return ServerManager.load(Config().get("query_workers"))
+
+
+def start_push_server(args, server_manager) -> None:
+    """
+    Start the push API if a port is given on the command line or in the config
+    :param args:  parsed command line arguments
+    :param server_manager:  ServerManager
+    :return:
+    """
+    port = args.push_port if args.push_port is not None else Config().get("push_api_port")
+    if not port:
+        return
+
+    try:
+        PushServer(server_manager, port).start()
+    except OSError as e:
+        print(f"Error starting the push API on port {port}:", e)
+
+
+def run_headless(args) -> None:
+    """
+    Refresh the servers without the window, printing the summary of the server list until interrupted
+    :param args:  parsed command line arguments
+    :return:
+    """
+    Config().load(get_config_file_content())
+    server_manager = create_server_manager(args)
+    start_push_server(args, server_manager)
+
+    try:
+        while True:
+            time.sleep(args.summary_interval)
+            print(format_summary(server_manager.get_summary()), end="\n\n", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server_manager.close()
+
+
+def run_export(args) -> None:
+    """
+    Refresh the servers once and export them, without the window
+    :param args:  parsed command line arguments
+    :return:
+    """
+    Config().load(get_config_file_content())
+    server_manager = create_server_manager(args)
+
+    try:
+        server_manager.refresh_all()
+        time.sleep(args.export_wait)
+        count = export_servers(server_manager.get_servers(), args.export)
+        print(f"Exported {count} servers to {args.export}")
+    except (ImportError, ValueError, OSError) as e:
+        print("Error exporting servers:", e)
+        sys.exit(1)
+    finally:
+        server_manager.close()
+
+
 def main():
+    args = parse_args()
+    if args.export:
+        run_export(args)
+        return
+    if args.headless:
+        run_headless(args)
+        return
+
     app = QApplication(sys.argv)
     app.setStyle(QStyleFactory.create('fusion'))
     app.setWindowIcon(QIcon(os.path.join(basedir, 'icons', 'logo.png')))
@@ -24,11 +141,16 @@ def main():
         import ctypes
         ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(APP_NAME_LOWER)
 
-    ex = MainWindow()
+    server_manager = create_server_manager(args)
+    start_push_server(args, server_manager)
+
+    ex = MainWindow(server_manager)
     ex.setWindowTitle(f'{APP_NAME} - {APP_VERSION}')
     ex.show()
     sys.exit(app.exec())
 
 
 if __name__ == '__main__':
+    # Needed by the query worker processes in frozen builds
+    multiprocessing.freeze_support()
     main()
@@ -4,3 +4,9 @@ APP_NAME = "YADAS"
 APP_NAME_LOWER = "yadas"
 # Set app version
 APP_VERSION = 'develop'
+# Width in ms of the ping buckets used to detect ping changes
+PING_BUCKET_SIZE = 10
+# Seconds a server refresh result is reused by the refreshes requested right after it
+REFRESH_CACHE_TTL = 0.5
+# Name of the server list stored in the original database file, which always exists
+DEFAULT_SERVER_LIST = "Default"
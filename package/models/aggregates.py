@@ -0,0 +1,156 @@
+import math
+import threading
+from collections import Counter
+from typing import NamedTuple
+
+from package.enums.latencyenum import LatencyEnum
+
+# Fill rate ranges of the fill distribution
+FILL_RATE_BUCKETS = ["Empty", "1-25%", "26-50%", "51-75%", "76-99%", "Full"]
+
+
+class Contribution(NamedTuple):
+    """
+    What a server adds to the aggregates, kept to subtract it when the server changes
+    """
+    game: str
+    map_name: str
+    players: int
+    fill_bucket: int
+    down: bool
+
+
+def get_fill_bucket(player_count, max_players) -> int:
+    """
+    Get the fill rate range of a server
+    :param player_count:  int players
+    :param max_players:  int maximum players
+    :return:  int index in FILL_RATE_BUCKETS, None if the maximum is unknown
+    """
+    if max_players <= 0:
+        return None
+    if player_count <= 0:
+        return 0
+    if player_count >= max_players:
+        return len(FILL_RATE_BUCKETS) - 1
+    # Round up, so exact quarters stay in the lower range: 8/32 is 1-25%, 16/32 is 26-50%
+    return min(math.ceil(player_count * 4 / max_players), 4)
+
+
+class ServerAggregates:
+    """
+    Totals of the server list: players overall, per game and per map, fill rate distribution and timed out servers.
+    Each change subtracts the previous contribution of the server and adds the new one, so keeping them up to date
+    doesn't depend on the number of servers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contributions = dict[str, Contribution]()
+        self.total_players = 0
+        self.timed_out = 0
+        self.players_per_game = Counter()
+        self.players_per_map = Counter()
+        self.fill_distribution = [0] * len(FILL_RATE_BUCKETS)
+
+    def update(self, server) -> None:
+        """
+        Update the aggregates with the current state of a server. Timed out servers count as down and their last
+        known players are not counted.
+        :param server:  GameServer object
+        :return:
+        """
+        down = server.ping == LatencyEnum.TIMEOUT
+        contribution = Contribution(
+            game=server.game,
+            map_name=server.map_name,
+            players=0 if down else server.player_count,
+            fill_bucket=None if down else get_fill_bucket(server.player_count, server.max_players),
+            down=down,
+        )
+
+        with self._lock:
+            old = self._contributions.get(str(server))
+            if old == contribution:
+                return
+            if old:
+                self._apply(old, -1)
+            self._apply(contribution, 1)
+            self._contributions[str(server)] = contribution
+
+    def remove(self, address) -> None:
+        """
+        Subtract a removed server from the aggregates
+        :param address:  str address
+        :return:
+        """
+        with self._lock:
+            old = self._contributions.pop(address, None)
+            if old:
+                self._apply(old, -1)
+
+    def summary(self) -> dict:
+        """
+        Get a copy of the aggregates
+        :return:  dict with servers, total_players, timed_out, players_per_game, players_per_map and
+                  fill_distribution
+        """
+        with self._lock:
+            return {
+                "servers": len(self._contributions),
+                "total_players": self.total_players,
+                "timed_out": self.timed_out,
+                "players_per_game": dict(self.players_per_game),
+                "players_per_map": dict(self.players_per_map),
+                "fill_distribution": dict(zip(FILL_RATE_BUCKETS, self.fill_distribution)),
+            }
+
+    def _apply(self, contribution, sign) -> None:
+        """
+        Add or subtract the contribution of a server. Must be called with the lock held.
+        :param contribution:  Contribution
+        :param sign:  int 1 to add, -1 to subtract
+        :return:
+        """
+        self.total_players += sign * contribution.players
+        self.timed_out += sign * contribution.down
+        if contribution.fill_bucket is not None:
+            self.fill_distribution[contribution.fill_bucket] += sign
+
+        for counter, key in ((self.players_per_game, contribution.game), (self.players_per_map, contribution.map_name)):
+            if key is None:
+                continue
+            counter[key] += sign * contribution.players
+            # Drop the games and maps nobody plays anymore, so they don't pile up
+            if counter[key] <= 0:
+                del counter[key]
+
+
+def format_summary(summary, top=10) -> str:
+    """
+    Format the aggregates as text
+    :param summary:  dict from ServerAggregates.summary
+    :param top:  int number of games and maps to show
+    :return:  str summary
+    """
+    lines = [f"Servers: {summary['servers']}, players: {summary['total_players']}, "
+             f"timed out: {summary['timed_out']}"]
+
+    for title, counts in (("Players per game", summary["players_per_game"]),
+                          ("Players per map", summary["players_per_map"])):
+        lines.append(f"{title}:")
+        for name, players in sorted(counts.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"  {name}: {players}")
+
+    lines.append("Fill rate: " + ", ".join(f"{bucket} {count}"
+                                           for bucket, count in summary["fill_distribution"].items()))
+
+    if pool := summary.get("refresh_pool"):
+        lines.append(f"Refresh pool: {pool['running']}/{pool['workers']} busy ({pool['utilization']:.0%}), "
+                     f"{pool['queued']} queued, {pool['completed']} done, {pool['skipped']} skipped while refreshing, "
+                     f"{pool['rejected']} rejected with the queue full")
+    if limiter := summary.get("rate_limiter"):
+        lines.append(f"Rate limiter: {limiter['pending']} waiting, {limiter['delayed']}/{limiter['acquired']} queries "
+                     f"delayed, {limiter['average_wait']:.3f}s average wait, {limiter['max_wait']:.3f}s max wait, "
+                     f"{limiter['backlog']:.3f}s backlog")
+    return "\n".join(lines)
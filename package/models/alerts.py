@@ -0,0 +1,207 @@
+import operator
+import threading
+import time
+
+from package.enums.latencyenum import LatencyEnum
+
+# Server fields rules can use, and how to read them from a GameServer. Timed out and unmeasured servers have no
+# ping, use "down" for them.
+FIELDS = {
+    "name": lambda server: server.name,
+    "game": lambda server: server.game,
+    "map_name": lambda server: server.map_name,
+    "player_count": lambda server: server.player_count,
+    "max_players": lambda server: server.max_players,
+    "ping": lambda server: server.ping if server.ping >= 0 else None,
+    "down": lambda server: server.ping == LatencyEnum.TIMEOUT,
+    "password": lambda server: server.password,
+    "vac": lambda server: server.vac,
+    "jitter": lambda server: server.latency_stats.jitter,
+    "ping_p50": lambda server: server.latency_stats.percentile(50),
+    "ping_p95": lambda server: server.latency_stats.percentile(95),
+    "ping_p99": lambda server: server.latency_stats.percentile(99),
+    "loss": lambda server: server.latency_stats.loss_rate(),
+}
+
+
+def _ordering(op):
+    # Fields that are not known yet (None) never match an ordering comparison
+    return lambda value, other: value is not None and op(value, other)
+
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": _ordering(operator.gt),
+    ">=": _ordering(operator.ge),
+    "<": _ordering(operator.lt),
+    "<=": _ordering(operator.le),
+    "in": lambda value, values: value in values,
+    "contains": lambda value, part: value is not None and part in value,
+}
+
+
+class Rule:
+    """
+    Alert rule compiled from its definition, e.g.
+    {"name": "Busy dust2", "when": [["player_count", ">", 20], ["map_name", "==", "de_dust2"]], "for": 30}
+    The alert fires when all the conditions hold for "for" seconds, and clears when they don't hold for "clear_for"
+    seconds.
+    """
+
+    def __init__(self, definition, columns):
+        self.name = definition["name"]
+        self.trigger_after = definition.get("for", 0)
+        self.clear_after = definition.get("clear_for", 0)
+
+        conditions = []
+        for field, op, value in definition["when"]:
+            if field not in FIELDS:
+                raise ValueError(f"Unknown field {field} in alert rule {self.name}")
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op} in alert rule {self.name}")
+            conditions.append((columns[field], OPERATORS[op], value))
+        self._conditions = conditions
+
+    def evaluate(self, slots) -> set[int]:
+        """
+        Evaluate the rule for the servers in the given slots of the columns, one condition at a time over the slots
+        still matching
+        :param slots:  list of int slots
+        :return:  set of the matching slots
+        """
+        for column, op, value in self._conditions:
+            slots = [slot for slot in slots if op(column[slot], value)]
+        return set(slots)
+
+
+class AlertEngine:
+    """
+    Evaluates alert rules over all servers. The server fields are kept in columns, and rules are only re-evaluated
+    for the servers that changed since the last tick, and for the ones waiting for their trigger or clear time.
+    Listeners are notified when an alert fires or clears.
+    """
+
+    def __init__(self, definitions):
+        self._lock = threading.Lock()
+        self._listeners = []
+
+        # Columnar store of the server fields, one slot per server
+        self._columns = {field: [] for field in FIELDS}
+        self._slot_of = dict[str, int]()
+        self._addresses = list[str]()
+        self._free_slots = []
+
+        self.rules = []
+        for definition in definitions:
+            try:
+                self.rules.append(Rule(definition, self._columns))
+            except (KeyError, ValueError, TypeError) as e:
+                print("Error compiling alert rule:", e)
+
+        self._changed = set[int]()
+        # (rule index, slot) -> timestamp since the condition changed, for alerts waiting to fire or clear
+        self._pending = dict[tuple[int, int], float]()
+        self._firing = set[tuple[int, int]]()
+
+    def on_alert(self, callback) -> None:
+        """
+        Add a listener for alerts, called with (event, rule name, address) where event is "FIRED" or "CLEARED"
+        :param callback:  function
+        :return:
+        """
+        self._listeners.append(callback)
+
+    def update(self, server) -> None:
+        """
+        Store the current fields of a refreshed server, to evaluate it on the next tick
+        :param server:  GameServer object
+        :return:
+        """
+        if not self.rules:
+            return
+
+        address = str(server)
+        with self._lock:
+            slot = self._slot_of.get(address)
+            if slot is None:
+                slot = self._allocate(address)
+            for field, getter in FIELDS.items():
+                self._columns[field][slot] = getter(server)
+            self._changed.add(slot)
+
+    def remove(self, address) -> None:
+        """
+        Forget a removed server, dropping its alerts without notifying
+        :param address:  str address
+        :return:
+        """
+        with self._lock:
+            slot = self._slot_of.pop(address, None)
+            if slot is None:
+                return
+            self._changed.discard(slot)
+            for r in range(len(self.rules)):
+                self._pending.pop((r, slot), None)
+                self._firing.discard((r, slot))
+            self._addresses[slot] = None
+            self._free_slots.append(slot)
+
+    def tick(self) -> None:
+        """
+        Evaluate the rules for the changed servers, and fire or clear the alerts whose time has come
+        :return:
+        """
+        now = time.monotonic()
+        events = []
+
+        with self._lock:
+            slots = list(self._changed)
+            self._changed.clear()
+
+            for r, rule in enumerate(self.rules):
+                try:
+                    matching = rule.evaluate(slots)
+                except TypeError as e:
+                    print(f"Error evaluating alert rule {rule.name}:", e)
+                    matching = set()
+
+                for slot in slots:
+                    key = (r, slot)
+                    # Start waiting when the condition changes against the current state, stop if it changes back
+                    if (slot in matching) != (key in self._firing):
+                        self._pending.setdefault(key, now)
+                    else:
+                        self._pending.pop(key, None)
+
+            for key, since in list(self._pending.items()):
+                rule = self.rules[key[0]]
+                firing = key in self._firing
+                if now - since >= (rule.clear_after if firing else rule.trigger_after):
+                    del self._pending[key]
+                    if firing:
+                        self._firing.discard(key)
+                    else:
+                        self._firing.add(key)
+                    events.append(("CLEARED" if firing else "FIRED", rule.name, self._addresses[key[1]]))
+
+        for event in events:
+            for listener in self._listeners:
+                listener(*event)
+
+    def _allocate(self, address) -> int:
+        """
+        Get a slot for a new server. Must be called with the lock held.
+        :param address:  str address
+        :return:  int slot
+        """
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._addresses[slot] = address
+        else:
+            slot = len(self._addresses)
+            self._addresses.append(address)
+            for column in self._columns.values():
+                column.append(None)
+        self._slot_of[address] = slot
+        return slot
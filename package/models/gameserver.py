@@ -1,15 +1,19 @@
+import math
 import time
 
-import a2s
-from a2s.defaults import DEFAULT_ENCODING
-
+from package.consts.consts import PING_BUCKET_SIZE, REFRESH_CACHE_TTL
 from package.enums.latencyenum import LatencyEnum
+from package.models.latencystats import LatencyStats
+from package.network.stream import open_stream
+from package.utils.singleflight import SingleFlight
 
 
 class GameServer:
     """
     GameServer class to store the server information.
     """
+    # Refreshes of the same address share one query, and a refresh right after another reuses its result
+    _refreshes = SingleFlight(REFRESH_CACHE_TTL)
 
     def __init__(self, address):
         ip, port = address.split(":")
@@ -30,7 +34,10 @@ class GameServer:
         self.rules = {}
         self.last_refresh = None
         self.latency_history = []
+        self.latency_stats = LatencyStats()
         self.reserved_slots = 0
+        self.query_delay = 0.0
+        self.players_hash = None
 
     def __str__(self) -> str:
         """
@@ -46,30 +53,43 @@ class GameServer:
         """
         return f"{self.ip}:{self.port}, {self.name}, {self.game}, {self.map_name}, {self.player_count}, {self.max_players}, {self.ping}, {self.password}, {self.vac}"
 
-    def refresh(self) -> tuple:
+    def refresh(self) -> dict[str, tuple]:
+        """
+        Refresh the server information over A2S. This is a blocking function. If a refresh of this server
+        is already in flight, or has just finished, its result is used instead of querying again.
+        :return: dict of changed fields, see fill_data. Empty if the result of another refresh was used.
         """
-        Refresh the server information using a2s library. This is an async function.
-        :return:
+        changes, shared = GameServer._refreshes.do(str(self), lambda: self.apply_query(*self.query()))
+        # The refresh that ran the query already reported the changes
+        return {} if shared else changes
+
+    def query(self) -> tuple:
+        """
+        Query the server information over A2S, without storing it. Info is None if the server timed out.
+        :return: tuple (info, players, rules)
         """
         val = None
         players = None
         rules = None
 
-        # Get the server information
+        stream = open_stream((self.ip, self.port), timeout=1.0)
         try:
-            val = a2s.info((self.ip, self.port), timeout=1.0, encoding=DEFAULT_ENCODING)
-            self.name = val.server_name
-        except Exception as e:
-            self.ping = LatencyEnum.TIMEOUT
-            self.add_latency(self.ping)
-            print(f"Error requesting server info for {self}:", e)
-            return val, None, None
+            # Get the server information
+            try:
+                val = stream.info()
+            except Exception as e:
+                print(f"Error requesting server info for {self}:", e)
+                return val, None, None
 
-        # Get the player list
-        try:
-            players = a2s.players((self.ip, self.port), timeout=1.0, encoding=DEFAULT_ENCODING)
-        except Exception as e:
-            print(f"Error requesting player list for {self}:", e)
+            # Get the player list
+            try:
+                players = stream.players()
+            except Exception as e:
+                print(f"Error requesting player list for {self}:", e)
+        finally:
+            # The rate limiter may have held the packets back, record for how long
+            self.query_delay = stream.query_delay
+            stream.close()
 
         # TODO: Get the server rules
         # try:
@@ -78,50 +98,99 @@ class GameServer:
         # except Exception as e:
         #     print("Error:", e)
 
-        self.fill_data(val, players, rules)
         return val, players, rules
 
+    def apply_query(self, info, players, rules) -> dict[str, tuple]:
+        """
+        Store the result of a query, marking the server as timed out if there is no info
+        :param info: ServerInfo, or None
+        :param players:  List of Player
+        :param rules:  Dict of rules from a2s library
+        :return: dict of changed fields, see fill_data
+        """
+        if info is None:
+            return self._set_ping(LatencyEnum.TIMEOUT)
+
+        return self.fill_data(info, players, rules)
+
     def is_valid(self) -> bool:
         """
-        Check if the server is valid by trying to get the server information synchronously.
+        Check if the server is valid by refreshing it synchronously.
         :return: bool
         """
-        try:
-            val = a2s.info((self.ip, self.port), timeout=1.0, encoding=DEFAULT_ENCODING)
-            self.name = val.server_name
-            return True
-        except Exception as e:
-            print("Error checking if server is valid:", e)
-            return False
+        self.refresh()
+        return self.ping != LatencyEnum.TIMEOUT
 
-    def fill_data(self, info, players, rules) -> None:
+    def fill_data(self, info, players, rules) -> dict[str, tuple]:
         """
-        Fill the server data with the information provided
-        :param info: Info object from a2s library
-        :param players:  List of players from a2s library
+        Fill the server data with the information provided and return what changed. Ping is compared by bucket and
+        players by a hash of their names, so small ping variations and score updates don't count as changes.
+        :param info: ServerInfo
+        :param players:  List of Player
         :param rules:  Dict of rules from a2s library
-        :return:
+        :return: dict of changed field name to (old value, new value). For "ping" the values are buckets.
         """
+        changes = {}
+
         if info:
-            self.name = info.server_name
-            self.game = info.folder
-            self.map_name = info.map_name
-            self.player_count = info.player_count
-            self.max_players = info.max_players
-            self.ping = int(info.ping * 1000)
-            self.password = info.password_protected
-            self.vac = info.vac_enabled
+            fields = {
+                "name": info.server_name,
+                "game": info.folder,
+                "map_name": info.map_name,
+                "player_count": info.player_count,
+                "max_players": info.max_players,
+                "password": info.password_protected,
+                "vac": info.vac_enabled,
+            }
+            for field, value in fields.items():
+                old_value = getattr(self, field)
+                if old_value != value:
+                    changes[field] = (old_value, value)
+                    setattr(self, field, value)
+
+            changes.update(self._set_ping(int(info.ping * 1000)))
             self.last_refresh = time.time()
-            self.add_latency(self.ping)
 
-        if players:
-            self.players = []
+        if players is not None:
+            players_hash = GameServer.hash_players(players)
+            if players_hash != self.players_hash:
+                changes["players"] = (self.players, players)
+                self.players_hash = players_hash
             self.players = players
 
         if rules:
             self.rules = rules
 
+        return changes
+
+    def _set_ping(self, ping) -> dict[str, tuple]:
+        """
+        Set the current ping and add it to the latency history
+        :param ping:  int ping in ms, or a LatencyEnum value
+        :return: dict with the "ping" bucket change, the "timeout_count" change and the "latency_stats" bucket change,
+                 each only if it changed
+        """
+        old_bucket = GameServer.get_ping_bucket(self.ping)
+        old_timeout_count = self.timeout_count
+        old_stats_bucket = self.get_stats_bucket()
+        self.ping = ping
+        self.add_latency(ping)
+
+        changes = {}
+        new_bucket = GameServer.get_ping_bucket(ping)
+        if old_bucket != new_bucket:
+            changes["ping"] = (old_bucket, new_bucket)
+        # Consecutive timeouts are displayed, and the loss keeps changing while the server is down
+        if old_timeout_count != self.timeout_count:
+            changes["timeout_count"] = (old_timeout_count, self.timeout_count)
+        new_stats_bucket = self.get_stats_bucket()
+        if old_stats_bucket != new_stats_bucket:
+            changes["latency_stats"] = (old_stats_bucket, new_stats_bucket)
+        return changes
+
     def add_latency(self, ping) -> None:
+        self.latency_stats.add(ping)
+
         if ping == LatencyEnum.TIMEOUT:
             self.timeout_count += 1
         else:
@@ -155,6 +224,35 @@ class GameServer:
             self.latency_history = [0]
         return self.latency_history
 
+    @staticmethod
+    def get_ping_bucket(ping) -> int:
+        """
+        Get the bucket a ping falls in. Timeout and not measured are buckets of their own.
+        :param ping:  int ping in ms, or a LatencyEnum value
+        :return: int bucket
+        """
+        return ping if ping < 0 else ping // PING_BUCKET_SIZE
+
+    def get_stats_bucket(self) -> tuple:
+        """
+        Get the buckets of the displayed latency statistics: jitter and p95 by ping bucket, loss by whole percent
+        :return: tuple (jitter bucket, p95 bucket, loss percent), None for the ones not available yet
+        """
+        stats = self.latency_stats
+        jitter, p95, loss = stats.jitter, stats.percentile(95), stats.loss_rate()
+        return (None if math.isnan(jitter) else int(jitter // PING_BUCKET_SIZE),
+                None if math.isnan(p95) else int(p95 // PING_BUCKET_SIZE),
+                None if math.isnan(loss) else round(loss))
+
+    @staticmethod
+    def hash_players(players) -> int:
+        """
+        Hash the names of a player list, in order
+        :param players:  list of Player
+        :return: int hash
+        """
+        return hash(tuple(player.name for player in players))
+
     @staticmethod
     def is_valid_address(address) -> bool:
         """
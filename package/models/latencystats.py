@@ -0,0 +1,170 @@
+import math
+
+from package.enums.latencyenum import LatencyEnum
+
+# Weight of the newest sample in the moving average, same as TCP's smoothed RTT
+EWMA_ALPHA = 0.125
+# Number of most recent queries used to compute the packet loss
+LOSS_WINDOW = 100
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimator using the P² algorithm (Jain & Chlamtac, 1985). Keeps five markers instead of the
+    samples, so memory and update time are constant.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x) -> None:
+        """
+        Add a sample to the estimator
+        :param x:  float sample
+        :return:
+        """
+        heights = self.heights
+
+        # The first five samples are the initial markers
+        if len(heights) < 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        # Find the cell the sample falls in, extending the extremes if needed
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, d)
+                heights[i] = height
+                positions[i] += d
+
+    def value(self) -> float:
+        """
+        Get the current estimate of the quantile
+        :return:  float estimate, NaN if there are no samples
+        """
+        if len(self.heights) == 5:
+            return self.heights[2]
+        if not self.heights:
+            return math.nan
+        return self.heights[round(self.p * (len(self.heights) - 1))]
+
+    def _parabolic(self, i, d) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def _linear(self, i, d) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+
+class LatencyStats:
+    """
+    Rolling latency statistics of a server: moving average, mean and variance, jitter, percentiles and packet loss.
+    Every sample is processed in constant time and nothing but the loss window is kept.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.ewma = math.nan
+        self.mean = math.nan
+        self._m2 = 0.0
+        self.jitter = math.nan
+        self._last = None
+        self._quantiles = {50: P2Quantile(0.5), 95: P2Quantile(0.95), 99: P2Quantile(0.99)}
+        self._lost = bytearray(LOSS_WINDOW)
+        self._lost_index = 0
+        self._lost_count = 0
+        self._window_size = 0
+
+    def add(self, ping) -> None:
+        """
+        Add a latency sample
+        :param ping:  int ping in ms, or LatencyEnum.TIMEOUT if the query was lost
+        :return:
+        """
+        lost = ping == LatencyEnum.TIMEOUT
+        self._add_loss(lost)
+        if lost or ping < 0:
+            return
+
+        self.count += 1
+        if self.count == 1:
+            self.ewma = self.mean = float(ping)
+        else:
+            self.ewma += EWMA_ALPHA * (ping - self.ewma)
+
+            # Welford's algorithm for mean and variance
+            delta = ping - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (ping - self.mean)
+
+        # Interarrival jitter as in RFC 3550, from the difference of consecutive samples
+        if self._last is not None:
+            difference = abs(ping - self._last)
+            self.jitter = difference if math.isnan(self.jitter) else self.jitter + (difference - self.jitter) / 16
+        self._last = ping
+
+        for quantile in self._quantiles.values():
+            quantile.add(ping)
+
+    def stddev(self) -> float:
+        """
+        Get the standard deviation of the latency
+        :return:  float ms, NaN with less than two samples
+        """
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    def percentile(self, percentile) -> float:
+        """
+        Get an estimated latency percentile
+        :param percentile:  int 50, 95 or 99
+        :return:  float ms, NaN if there are no samples
+        """
+        return self._quantiles[percentile].value()
+
+    def loss_rate(self) -> float:
+        """
+        Get the percentage of lost queries in the loss window
+        :return:  float percentage, NaN if there are no queries
+        """
+        return 100 * self._lost_count / self._window_size if self._window_size else math.nan
+
+    def _add_loss(self, lost) -> None:
+        """
+        Add a query to the loss window, replacing the oldest one
+        :param lost:  bool whether the query timed out
+        :return:
+        """
+        self._lost_count += lost - self._lost[self._lost_index]
+        self._lost[self._lost_index] = lost
+        self._lost_index = (self._lost_index + 1) % LOSS_WINDOW
+        self._window_size = min(self._window_size + 1, LOSS_WINDOW)
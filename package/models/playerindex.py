@@ -0,0 +1,170 @@
+import bisect
+import threading
+
+
+class PlayerIndex:
+    """
+    Inverted index from player name to the servers the player is on. Kept up to date from the player list changes of
+    each refresh, so searching doesn't have to scan the player list of every server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Normalized name -> {address: name as reported by the server}
+        self._entries = dict[str, dict[str, str]]()
+        # Trigram -> normalized names containing it
+        self._trigrams = dict[str, set[str]]()
+        # Sorted normalized names, for prefix search of queries too short to have trigrams
+        self._sorted_names = list[str]()
+        # Server address -> normalized names indexed for it
+        self._names_of = dict[str, set[str]]()
+
+    def update(self, address, old_players, new_players) -> None:
+        """
+        Update the index with the player list change of a server
+        :param address:  str server address
+        :param old_players:  list of Player previously on the server
+        :param new_players:  list of Player now on the server
+        :return:
+        """
+        old_names = {PlayerIndex.normalize(player.name) for player in old_players or []}
+        new_names = {PlayerIndex.normalize(player.name): player.name for player in new_players or []}
+
+        with self._lock:
+            for name in old_names - new_names.keys():
+                self._remove(name, address)
+            for name, display_name in new_names.items():
+                if name:
+                    self._add(name, address, display_name)
+
+    def remove_server(self, address) -> None:
+        """
+        Remove all the players of a server from the index, including the ones of a player list change that is still
+        being applied
+        :param address:  str server address
+        :return:
+        """
+        with self._lock:
+            for name in self._names_of.get(address, set()).copy():
+                self._remove(name, address)
+
+    def search(self, query, limit=100) -> list[tuple[str, str]]:
+        """
+        Search the players whose name contains the query, ignoring case. Queries shorter than 3 characters have no
+        trigrams, so they only match the start of the names.
+        :param query:  str query
+        :param limit:  int maximum number of results
+        :return:  list of (player name, server address), sorted by name
+        """
+        query = PlayerIndex.normalize(query)
+        if not query:
+            return []
+
+        with self._lock:
+            if len(query) < 3:
+                names = self._prefix_matches(query, limit)
+            else:
+                names = sorted(self._substring_matches(query))
+
+            results = []
+            for name in names:
+                for address, display_name in sorted(self._entries[name].items()):
+                    results.append((display_name, address))
+                    if len(results) >= limit:
+                        return results
+            return results
+
+    def _add(self, name, address, display_name) -> None:
+        """
+        Add a player to the index. Must be called with the lock held.
+        :param name:  str normalized name
+        :param address:  str server address
+        :param display_name:  str name as reported by the server
+        :return:
+        """
+        entry = self._entries.get(name)
+        if entry is None:
+            entry = self._entries[name] = {}
+            bisect.insort(self._sorted_names, name)
+            for trigram in PlayerIndex.trigrams(name):
+                self._trigrams.setdefault(trigram, set()).add(name)
+        entry[address] = display_name
+        self._names_of.setdefault(address, set()).add(name)
+
+    def _remove(self, name, address) -> None:
+        """
+        Remove a player from the index. Must be called with the lock held.
+        :param name:  str normalized name
+        :param address:  str server address
+        :return:
+        """
+        entry = self._entries.get(name)
+        if entry is None:
+            return
+
+        entry.pop(address, None)
+        names = self._names_of.get(address)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del self._names_of[address]
+        if entry:
+            return
+
+        # Last server with this name, drop the name altogether
+        del self._entries[name]
+        del self._sorted_names[bisect.bisect_left(self._sorted_names, name)]
+        for trigram in PlayerIndex.trigrams(name):
+            names = self._trigrams[trigram]
+            names.discard(name)
+            if not names:
+                del self._trigrams[trigram]
+
+    def _prefix_matches(self, query, limit) -> list[str]:
+        """
+        Get the names starting with the query. Must be called with the lock held.
+        :param query:  str normalized query
+        :param limit:  int maximum number of names
+        :return:  list of normalized names
+        """
+        names = []
+        for i in range(bisect.bisect_left(self._sorted_names, query), len(self._sorted_names)):
+            name = self._sorted_names[i]
+            if not name.startswith(query) or len(names) >= limit:
+                break
+            names.append(name)
+        return names
+
+    def _substring_matches(self, query) -> set[str]:
+        """
+        Get the names containing the query, intersecting the names of each of its trigrams. Must be called with the
+        lock held.
+        :param query:  str normalized query, at least 3 characters long
+        :return:  set of normalized names
+        """
+        candidates = None
+        for trigram in sorted(PlayerIndex.trigrams(query), key=lambda t: len(self._trigrams.get(t, ()))):
+            names = self._trigrams.get(trigram)
+            if not names:
+                return set()
+            candidates = set(names) if candidates is None else candidates & names
+        # Trigrams can match out of order, check the actual substring
+        return {name for name in candidates if query in name}
+
+    @staticmethod
+    def normalize(name) -> str:
+        """
+        Normalize a player name for searching: case folded, with collapsed whitespace
+        :param name:  str name
+        :return:  str normalized name
+        """
+        return " ".join((name or "").casefold().split())
+
+    @staticmethod
+    def trigrams(name) -> set[str]:
+        """
+        Get all the 3 character substrings of a name
+        :param name:  str normalized name
+        :return:  set of str
+        """
+        return {name[i:i + 3] for i in range(len(name) - 2)}
@@ -0,0 +1,92 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RefreshPool:
+    """
+    Bounded pool of threads for the blocking server queries. A server whose previous refresh is still queued or
+    running is not queued again, and no more refreshes are queued once the queue is full, so the number of threads
+    and queued refreshes stays flat however slow the network gets.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="refresh")
+        self._lock = threading.Lock()
+        # Keys of the refreshes queued or running
+        self._in_flight = set[str]()
+        self._running = 0
+        self.completed = 0
+        self.skipped = 0
+        self.rejected = 0
+
+    def submit(self, key, fn, *args) -> bool:
+        """
+        Queue a refresh, unless one with the same key is in flight or the queue is full
+        :param key:  str key, usually the server address
+        :param fn:  function to run
+        :param args:  arguments of the function
+        :return:  bool whether the refresh was queued
+        """
+        with self._lock:
+            if key in self._in_flight:
+                self.skipped += 1
+                return False
+            if len(self._in_flight) - self._running >= self.queue_size:
+                self.rejected += 1
+                return False
+            self._in_flight.add(key)
+
+        try:
+            self._executor.submit(self._run, key, fn, *args)
+        except RuntimeError:
+            # The pool was closed
+            with self._lock:
+                self._in_flight.discard(key)
+            return False
+        return True
+
+    def stats(self) -> dict:
+        """
+        Get the utilization of the pool
+        :return:  dict with workers, running, queued, utilization (fraction of busy workers), completed, skipped
+                  (already in flight) and rejected (queue full)
+        """
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": len(self._in_flight) - self._running,
+                "utilization": self._running / self.workers,
+                "completed": self.completed,
+                "skipped": self.skipped,
+                "rejected": self.rejected,
+            }
+
+    def close(self) -> None:
+        """
+        Drop the queued refreshes, without waiting for the running ones
+        :return:
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, key, fn, *args) -> None:
+        """
+        Run a refresh in a pool thread
+        :param key:  str key
+        :param fn:  function to run
+        :param args:  arguments of the function
+        :return:
+        """
+        with self._lock:
+            self._running += 1
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Error refreshing {key}:", e)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._in_flight.discard(key)
+                self.completed += 1
@@ -0,0 +1,85 @@
+import copy
+
+from package.consts.consts import DEFAULT_SERVER_LIST
+from package.models.gameserver import GameServer
+from package.utils.utils import get_db_file, get_db_file_path, get_list_file_path, save_to_db_file
+
+# GameServer attributes that are not saved, they are filled again by the queries
+TRANSIENT_ATTRIBUTES = ["ping", "rules", "last_refresh", "players", "latency_history", "latency_stats",
+                        "timeout_count", "query_delay", "players_hash"]
+
+
+class ServerList:
+    """
+    Named list of servers with its own refresh policy. Only the servers of active lists are queried, and the servers
+    of a list are only loaded from its file when the list is activated or opened.
+    """
+
+    def __init__(self, name, refresh_interval=None, active=True, persistent=True):
+        self.name = name
+        # Seconds between refreshes of the servers of the list, None to refresh them by visibility
+        self.refresh_interval = refresh_interval
+        self.active = active
+        # Whether the list is saved to its file
+        self.persistent = persistent
+        # Servers by address, None until loaded
+        self.servers = None
+
+    def load(self) -> dict[str, GameServer]:
+        """
+        Load the servers of the list from its file, if not loaded yet
+        :return:  dict of address -> GameServer
+        """
+        if self.servers is not None:
+            return self.servers
+
+        data = get_db_file(self.file_path()) if self.persistent else None
+        if data:
+            # Merge dict from file with the defaults of a new server. Each server gets its own defaults, so mutable
+            # attributes like the latency stats are not shared.
+            for server in data.values():
+                server.__dict__ = {**GameServer(str(server)).__dict__, **server.__dict__}
+        self.servers = data or {}
+        return self.servers
+
+    def save(self) -> None:
+        """
+        Save the servers of the list to its file, if they were loaded
+        :return:
+        """
+        if not self.persistent or self.servers is None:
+            return
+
+        data = {}
+        # Save copies without the attributes that are not needed, the servers may still be refreshing
+        for address, server in self.servers.copy().items():
+            saved = copy.copy(server)
+            for attribute in TRANSIENT_ATTRIBUTES:
+                saved.__dict__.pop(attribute, None)
+            data[address] = saved
+
+        save_to_db_file(data, self.file_path())
+
+    def delete(self) -> None:
+        """
+        Delete the file of the list
+        :return:
+        """
+        import os
+
+        if self.persistent and os.path.exists(self.file_path()):
+            os.remove(self.file_path())
+
+    def file_path(self) -> str:
+        """
+        Get the path to the file of the list. The default list uses the original database file.
+        :return:  str path
+        """
+        return get_db_file_path() if self.name == DEFAULT_SERVER_LIST else get_list_file_path(self.name)
+
+    def to_config(self) -> dict:
+        """
+        Get the settings of the list, as stored in the config
+        :return:  dict with name, refresh_interval and active
+        """
+        return {"name": self.name, "refresh_interval": self.refresh_interval, "active": self.active}
@@ -3,33 +3,101 @@ import threading
 import time
 from typing import List
 
+from package.consts.consts import DEFAULT_SERVER_LIST
+from package.models.aggregates import ServerAggregates
+from package.models.alerts import AlertEngine
 from package.models.gameserver import GameServer
-from package.utils.utils import get_db_file, save_to_db_file
+from package.models.playerindex import PlayerIndex
+from package.models.refreshpool import RefreshPool
+from package.models.serverlist import ServerList
+from package.models.shardpool import ShardPool
+from package.singleton.config import Config
+from package.singleton.ratelimiter import RateLimiter
 
 
 class ServerManager:
     """
-    ServerManager class to manage the servers in the server list.
+    ServerManager class to manage the servers in the server lists. The servers of the active lists are refreshed,
+    the rest are only kept in their lists.
     """
     servers = dict[str, GameServer]()
     selected = None
 
-    def __init__(self):
+    def __init__(self, workers=0, persistent=True):
+        # Whether the server lists are saved to their files
+        self.persistent = persistent
+
+        # Server lists by name, and the one open in the front end
+        self.lists = dict[str, ServerList]()
+        self.current_list = DEFAULT_SERVER_LIST
+        # Servers of the active lists, which are refreshed, and the active lists each one is in
+        self.servers = dict[str, GameServer]()
+        self._lists_of = dict[str, set[str]]()
+        # Held while a server starts or stops being refreshed, and while its refresh results are indexed, so the
+        # results of a server removed mid refresh can't reach the indexes and totals after its removal
+        self._watch_lock = threading.RLock()
+
+        # Index of the players of all servers, for searching
+        self.player_index = PlayerIndex()
+
+        # Totals of the server list, kept up to date from the changes
+        self.aggregates = ServerAggregates()
+
+        # Alert rules, evaluated on every auto refresh tick
+        self.alerts = AlertEngine(Config().get("alert_rules"))
+
+        # Query servers in worker processes if requested, otherwise in a bounded pool of threads of this process
+        self.shard_pool = ShardPool(workers, self._on_shard_result,
+                                    Config().get("refresh_pool_queue_size")) if workers else None
+        self.refresh_pool = RefreshPool(Config().get("refresh_pool_workers"), Config().get("refresh_pool_queue_size"))
+
+        # Servers currently visible in the front end. None if the front end doesn't report it, then all servers are
+        # treated as visible.
+        self.visible = None
+        self._last_refresh_attempt = dict[str, float]()
+
         # Set autorefresh interval in a new thread every 5 seconds
-        self.auto_refresh_interval = 1  # Interval in seconds
+        self.auto_refresh_interval = 1  # Interval in seconds, also used for the selected server
+        self.visible_refresh_interval = 5  # Interval in seconds
+        self.background_refresh_interval = 30  # Interval in seconds
         self.auto_refresh_thread = threading.Thread(target=self._auto_refresh, daemon=True)
         self.auto_refresh_thread.start()
 
         self._listeners = []
 
-    def add_server(self, server) -> None:
+    def add_server(self, server, list_name=None) -> None:
         """
-        Add a server to the server list
+        Add a server to a server list
         :param server:  GameServer object
+        :param list_name:  str list name, the current list if None
         :return:
         """
-        self.servers[str(server)] = server
-        self._notify_listeners("ADD", str(server))
+        server_list = self.get_list(list_name)
+        address = str(server)
+        # The same server in several lists is a single object, so it's refreshed once
+        server = self.servers.get(address, server)
+        server_list.load()[address] = server
+        if server_list.active:
+            self._watch(server, server_list.name)
+        self._notify_listeners("ADD", address)
+
+    def add_server_if_valid(self, server, list_name=None) -> bool:
+        """
+        Check in the refresh pool that a server answers, and add it to a server list if it does
+        :param server:  GameServer object
+        :param list_name:  str list name, the current list if None. Resolved now, not when the check finishes.
+        :return:  bool whether the check was queued, False if the same server is already being checked or the queue
+                  is full
+        """
+        list_name = list_name or self.current_list
+
+        def add_if_valid():
+            # The list may have been deleted in the meantime
+            if server.is_valid() and list_name in self.lists:
+                self.add_server(server, list_name)
+
+        # Its own key, so it's not skipped when the server is being refreshed for another list
+        return self.refresh_pool.submit(f"add:{server}", add_if_valid)
 
     def update_server(self, server) -> None:
         """
@@ -37,26 +105,41 @@ class ServerManager:
         :param server:  GameServer object
         :return:
         """
-        self.servers.update({str(server): server})
+        if str(server) in self.servers:
+            self.servers.update({str(server): server})
+            self.aggregates.update(server)
         self._notify_listeners("UPDATE", str(server))
 
-    def remove_server(self, server) -> None:
+    def remove_server(self, address, list_name=None) -> None:
         """
-        Remove a server from the server list
-        :param server:  GameServer object
+        Remove a server from a server list. The listeners are only notified if the server is no longer refreshed,
+        a server still in another active list keeps being refreshed.
+        :param address:  str address
+        :param list_name:  str list name, the current list if None
         :return:
         """
-        if server in self.servers:
-            del self.servers[str(server)]
-            self._notify_listeners("DELETE", str(server))
+        server_list = self.get_list(list_name)
+        if address in server_list.load():
+            del server_list.servers[address]
+            if server_list.active and self._unwatch(address, server_list.name):
+                self._notify_listeners("DELETE", address)
+
+    def has_server(self, address, list_name=None) -> bool:
+        """
+        Check if a server is in a server list
+        :param address:  str address
+        :param list_name:  str list name, the current list if None
+        :return:  bool
+        """
+        return address in self.get_list(list_name).load()
 
     def get_server_by_address(self, address) -> GameServer:
         """
-        Get a server by its address
+        Get a server by its address, from the refreshed servers or else from the current list
         :param address:  str address
         :return:  GameServer object
         """
-        return self.servers.get(address)
+        return self.servers.get(address) or self.get_list(None).load().get(address)
 
     def get_server_by_ip_port(self, ip, port) -> GameServer:
         """
@@ -67,21 +150,127 @@ class ServerManager:
         """
         return self.servers.get(f"{ip}:{port}")
 
+    def search_players(self, query) -> list[tuple[str, str]]:
+        """
+        Search players by name across all servers, see PlayerIndex.search
+        :param query:  str part of the player name, or its start if shorter than 3 characters
+        :return:  list of (player name, server address)
+        """
+        return self.player_index.search(query)
+
+    def get_summary(self) -> dict:
+        """
+        Get the totals of the server list, see ServerAggregates.summary, the utilization of the pool running the
+        refreshes and the wait statistics of the rate limiter, of the worker processes if the queries run in them
+        :return:  dict summary, with the pool stats in "refresh_pool" and the limiter stats in "rate_limiter"
+        """
+        summary = self.aggregates.summary()
+        summary["refresh_pool"] = (self.shard_pool or self.refresh_pool).stats()
+        summary["rate_limiter"] = self.shard_pool.limiter_stats() if self.shard_pool else RateLimiter().stats()
+        return summary
+
     def get_servers(self) -> List[GameServer]:
         """
-        Get all servers
+        Get all the refreshed servers, the ones in the active lists
         :return:  List of GameServer objects
         """
         return list(self.servers.values())
 
+    def get_list_servers(self, list_name=None) -> List[GameServer]:
+        """
+        Get the servers of a server list, loading it if needed
+        :param list_name:  str list name, the current list if None
+        :return:  List of GameServer objects
+        """
+        return list(self.get_list(list_name).load().values())
+
+    def get_list(self, list_name=None) -> ServerList:
+        """
+        Get a server list
+        :param list_name:  str list name, the current list if None
+        :return:  ServerList
+        """
+        return self.lists[list_name or self.current_list]
+
+    def open_list(self, list_name) -> None:
+        """
+        Make a server list the current one, loading it if needed. Opening a list doesn't activate it.
+        :param list_name:  str list name
+        :return:
+        """
+        self.get_list(list_name).load()
+        self.current_list = list_name
+
+    def create_list(self, list_name, refresh_interval=None) -> ServerList:
+        """
+        Create an empty, active server list
+        :param list_name:  str list name
+        :param refresh_interval:  float seconds between refreshes of its servers, None to refresh them by visibility
+        :return:  ServerList
+        """
+        if not list_name or list_name in self.lists:
+            raise ValueError(f"A server list named {list_name!r} already exists" if list_name else
+                             "The server list needs a name")
+
+        server_list = ServerList(list_name, refresh_interval, persistent=self.persistent)
+        server_list.servers = {}
+        self.lists[list_name] = server_list
+        return server_list
+
+    def delete_list(self, list_name) -> None:
+        """
+        Delete a server list and its file. The default list can't be deleted.
+        :param list_name:  str list name
+        :return:
+        """
+        if list_name == DEFAULT_SERVER_LIST:
+            raise ValueError("The default server list can't be deleted")
+
+        self.set_list_active(list_name, False)
+        self.lists.pop(list_name).delete()
+        if self.current_list == list_name:
+            self.current_list = DEFAULT_SERVER_LIST
+
+    def set_list_active(self, list_name, active) -> None:
+        """
+        Activate or deactivate a server list. The servers of inactive lists are not refreshed, unless they are also
+        in an active list.
+        :param list_name:  str list name
+        :param active:  bool
+        :return:
+        """
+        server_list = self.get_list(list_name)
+        if server_list.active == active:
+            return
+
+        server_list.active = active
+        for address, server in server_list.load().copy().items():
+            if active:
+                # Use the server object of the other active lists, if any
+                server = server_list.servers[address] = self.servers.get(address, server)
+                if self._watch(server, list_name):
+                    self._notify_listeners("ADD", address)
+            elif self._unwatch(address, list_name):
+                self._notify_listeners("DELETE", address)
+
+    def set_list_refresh_interval(self, list_name, refresh_interval) -> None:
+        """
+        Set how often the servers of a list are refreshed
+        :param list_name:  str list name
+        :param refresh_interval:  float seconds, None to refresh them by visibility
+        :return:
+        """
+        self.get_list(list_name).refresh_interval = refresh_interval
+
     def refresh_all(self) -> None:
         """
         Refresh all servers
         :return:
         """
+        timestamp = time.time()
         for server in self.servers.copy().values():
-            threading.Thread(target=server.refresh).start()
-            self._notify_listeners("UPDATE", str(server))
+            if self._refresh_server(server):
+                self._last_refresh_attempt[str(server)] = timestamp
 
     def on_update(self, callback) -> None:
         """
@@ -108,22 +297,108 @@ class ServerManager:
         """
         self.selected = address
 
+    def set_visible(self, addresses) -> None:
+        """
+        Set the servers visible in the front end, so they are refreshed more often than the rest. Servers that just
+        became visible are refreshed right away, unless they were refreshed recently.
+        :param addresses:  set of str addresses
+        :return:
+        """
+        newly_visible = addresses - self.visible if self.visible is not None else addresses
+        self.visible = addresses
+
+        timestamp = time.time()
+        for address in newly_visible:
+            server = self.servers.get(address)
+            if server and timestamp - self._last_refresh_attempt.get(address, 0) >= self.auto_refresh_interval:
+                if self._refresh_server(server):
+                    self._last_refresh_attempt[address] = timestamp
+
+    def get_refresh_interval(self, address) -> float:
+        """
+        Get how often a server should be refreshed: every second if selected, and otherwise at the interval of its
+        lists. Lists without an interval refresh their servers every few seconds if visible, and at a low background
+        rate if not. A server in several lists uses the shortest interval.
+        :param address:  str address
+        :return:  float interval in seconds
+        """
+        if address == self.selected:
+            return self.auto_refresh_interval
+
+        if self.visible is None or address in self.visible:
+            default_interval = self.visible_refresh_interval
+        else:
+            default_interval = self.background_refresh_interval
+        # The lists may change in the front end thread while the auto refresh thread asks
+        lists = [self.lists.get(name) for name in tuple(self._lists_of.get(address, ()))]
+        return min((server_list.refresh_interval or default_interval for server_list in lists if server_list),
+                   default=default_interval)
+
     def save(self) -> None:
         """
-        Save the server list to a file
+        Save the loaded server lists to their files, and their settings to the config
         :return:
         """
-        data = self.servers.copy()
-        # Remove attributes that are not needed
-        for server in data.values():
-            server.__dict__.pop("ping")
-            server.__dict__.pop("rules")
-            server.__dict__.pop("last_refresh")
-            server.__dict__.pop("players")
-            server.__dict__.pop("latency_history")
-            server.__dict__.pop("timeout_count")
+        if not self.persistent:
+            return
+
+        for server_list in self.lists.values():
+            server_list.save()
+        Config().set("server_lists", [server_list.to_config() for server_list in self.lists.values()])
+
+    def _watch(self, server, list_name) -> bool:
+        """
+        Start refreshing a server of an active list
+        :param server:  GameServer object
+        :param list_name:  str name of the active list
+        :return:  bool whether the server wasn't refreshed before
+        """
+        address = str(server)
+        with self._watch_lock:
+            self._lists_of.setdefault(address, set()).add(list_name)
+            if address in self.servers:
+                return False
+
+            self.servers[address] = server
+            self.player_index.update(address, [], server.players)
+            self.aggregates.update(server)
+            self.alerts.update(server)
+            return True
+
+    def _unwatch(self, address, list_name) -> bool:
+        """
+        Stop refreshing a server of a list that is no longer active, unless it's in another active list
+        :param address:  str address
+        :param list_name:  str name of the list
+        :return:  bool whether the server is no longer refreshed
+        """
+        with self._watch_lock:
+            lists = self._lists_of.get(address)
+            if lists is None:
+                return False
+            lists.discard(list_name)
+            if lists:
+                return False
 
-        save_to_db_file(data)
+            del self._lists_of[address]
+            del self.servers[address]
+            self.player_index.remove_server(address)
+            self._last_refresh_attempt.pop(address, None)
+            self.aggregates.remove(address)
+            self.alerts.remove(address)
+            return True
+
+    def _add_list(self, server_list) -> None:
+        """
+        Add a server list, loading and refreshing its servers if it's active
+        :param server_list:  ServerList
+        :return:
+        """
+        self.lists[server_list.name] = server_list
+        if server_list.active:
+            for address, server in server_list.load().items():
+                server = server_list.servers[address] = self.servers.get(address, server)
+                self._watch(server, server_list.name)
 
     def _auto_refresh(self) -> None:
         """
@@ -131,37 +406,128 @@ class ServerManager:
         :return:
         """
         while True:
-            # Refresh all only every 5 seconds. For selected server, refresh every second
-            timestamp = int(time.time())
-            if timestamp % 5 == 0:
-                self.refresh_all()
-            elif self.selected is not None:
-                server = self.servers.get(self.selected)
-                if server:
-                    threading.Thread(target=server.refresh).start()
-                    self._notify_listeners("UPDATE", str(server))
+            # Refresh every server whose interval has elapsed. If the rate limiter still has more than a cycle of
+            # queries queued up, only refresh the selected server instead of piling up more delayed queries.
+            timestamp = time.time()
+            backlog = self.shard_pool.backlog() if self.shard_pool else RateLimiter().backlog()
+            backlogged = backlog >= self.visible_refresh_interval
+            for address, server in self.servers.copy().items():
+                if backlogged and address != self.selected:
+                    continue
+                # Servers still refreshing or not admitted by the full pool are tried again on the next tick
+                if timestamp - self._last_refresh_attempt.get(address, 0) >= self.get_refresh_interval(address):
+                    if self._refresh_server(server):
+                        self._last_refresh_attempt[address] = timestamp
+            self.alerts.tick()
             time.sleep(self.auto_refresh_interval)
 
-    def _notify_listeners(self, event, address) -> None:
+    def _refresh_server(self, server) -> bool:
+        """
+        Refresh a server, either in the shard pool or in the refresh pool
+        :param server:  GameServer object
+        :return:  bool whether the refresh was queued, False if the server is still refreshing or the pool is full
+        """
+        if self.shard_pool:
+            # Listeners are notified when the result comes back from the worker
+            return self.shard_pool.submit(str(server))
+
+        return self.refresh_pool.submit(str(server), self._refresh_and_notify, server)
+
+    def _refresh_and_notify(self, server) -> None:
+        """
+        Refresh a server and notify the listeners of its changes
+        :param server:  GameServer object
+        :return:
+        """
+        self._notify_changes(server, server.refresh())
+
+    def _on_shard_result(self, address, info, players, rules, query_delay) -> None:
+        """
+        Merge a query result from the shard pool into the server list
+        :param address:  str address
+        :param info:  ServerInfo, or None if the server timed out
+        :param players:  List of Player
+        :param rules:  Dict of rules from a2s library
+        :param query_delay:  float seconds the query waited in the rate limiter
+        :return:
+        """
+        server = self.servers.get(address)
+        if server is None:
+            return
+
+        server.query_delay = query_delay
+        self._notify_changes(server, server.apply_query(info, players, rules))
+
+    def _notify_changes(self, server, changes) -> None:
+        """
+        Notify the listeners of a refreshed server, only if something changed. The selected server is always
+        notified, since its latency graph changes on every refresh.
+        :param server:  GameServer object
+        :param changes:  dict of changed fields, see GameServer.fill_data
+        :return:
+        """
+        address = str(server)
+        with self._watch_lock:
+            # The server may have been removed while it was refreshing
+            if self.servers.get(address) is not server:
+                return
+
+            if "players" in changes:
+                self.player_index.update(address, *changes["players"])
+            if changes:
+                self.aggregates.update(server)
+            # The alert rules may use the exact ping and latency statistics, which move on every refresh
+            self.alerts.update(server)
+
+        if changes or address == self.selected:
+            self._notify_listeners("UPDATE", address, changes)
+
+    def _notify_listeners(self, event, address, changes=None) -> None:
         """
         Notify all listeners of a change in the server list
         :param event:  str event
         :param address:  str address
+        :param changes:  dict of changed fields for "UPDATE" events, None if unknown
         :return:
         """
         for listener in self._listeners:
-            listener(self, event, address)
+            listener(self, event, address, changes)
+
+    def close(self) -> None:
+        """
+        Stop the refresh pool and the worker processes, if any
+        :return:
+        """
+        self.refresh_pool.close()
+        if self.shard_pool:
+            self.shard_pool.close()
 
     @staticmethod
-    def load() -> "ServerManager":
-        try:
-            manager = ServerManager()
-            if data := get_db_file():
-                temp = GameServer("0.0.0.0:0")
-                # Merge dict from file with the current dict
-                for server in data.values():
-                    server.__dict__ = {**temp.__dict__, **server.__dict__}
-                manager.servers = data
-            return manager
-        except FileNotFoundError:
-            return ServerManager()
+    def from_addresses(addresses) -> "ServerManager":
+        """
+        Create a server manager with the given servers, which is not saved to the database file
+        :param addresses:  list of str addresses
+        :return:  ServerManager
+        """
+        manager = ServerManager(persistent=False)
+        server_list = ServerList(DEFAULT_SERVER_LIST, persistent=False)
+        server_list.servers = {address: GameServer(address) for address in addresses}
+        manager._add_list(server_list)
+        return manager
+
+    @staticmethod
+    def load(workers=0) -> "ServerManager":
+        """
+        Create a server manager with the server lists of the config. Only the active lists are loaded, the rest are
+        loaded when opened.
+        :param workers:  int number of query worker processes, 0 to query in threads
+        :return:  ServerManager
+        """
+        manager = ServerManager(workers)
+        settings = Config().get("server_lists")
+        if not any(entry["name"] == DEFAULT_SERVER_LIST for entry in settings):
+            settings = [{"name": DEFAULT_SERVER_LIST}, *settings]
+
+        for entry in settings:
+            manager._add_list(ServerList(entry["name"], entry.get("refresh_interval"), entry.get("active", True)))
+        return manager
@@ -0,0 +1,265 @@
+import multiprocessing
+import multiprocessing.connection
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from package.models.gameserver import GameServer
+from package.singleton.config import Config
+from package.singleton.ratelimiter import RateLimiter
+
+# Number of concurrent queries each worker process keeps in flight
+WORKER_THREADS = 32
+# Seconds the collector waits for results before checking whether the pool was closed
+COLLECT_TIMEOUT = 0.5
+
+
+def _worker_main(config, tasks, results) -> None:
+    """
+    Query loop of a worker process. Reads addresses from its task queue, queries them and sends the results to its
+    own results pipe as ((address, info, players, rules, query_delay), limiter stats) tuples, where limiter stats
+    are the RateLimiter.stats of the worker. A None task stops the worker.
+    :param config:  dict config for this worker
+    :param tasks:  multiprocessing.Queue of str addresses
+    :param results:  multiprocessing.connection.Connection, write end of the results pipe
+    :return:
+    """
+    Config().load(config)
+    results_lock = threading.Lock()
+
+    def query(address):
+        server = GameServer(address)
+        try:
+            info, players, rules = server.query()
+        except Exception as e:
+            # Always answer, the main process keeps the address in flight until it gets a result
+            print(f"Error querying {address}:", e)
+            info, players, rules = None, None, None
+        with results_lock:
+            results.send(((address, info, players, rules, server.query_delay), RateLimiter().stats()))
+
+    with ThreadPoolExecutor(max_workers=WORKER_THREADS) as executor:
+        while (address := tasks.get()) is not None:
+            executor.submit(query, address)
+
+
+class ShardPool:
+    """
+    Pool of worker processes that query servers. Servers are sharded by a hash of their ip, so each worker owns a
+    fixed subset of the hosts and the per ip rate limit still holds. Results are handed to a callback in the main
+    process, which is the only place where the GameServer objects are updated.
+    An address whose query is still in flight is not queued again, and each worker takes at most its share of the
+    queue size on top of the queries it's running, so the task queues can't grow without bound. A worker that died is
+    restarted, dropping the queries it had in flight. Each worker has its own queues, so a worker killed while
+    writing a result can't leave a shared queue locked or half written.
+    """
+
+    def __init__(self, workers, on_result, queue_size):
+        self.workers = workers
+        self._on_result = on_result
+        # Queries each worker may have queued or running
+        self._shard_limit = WORKER_THREADS + max(1, queue_size // workers)
+        self._lock = threading.Lock()
+        # Addresses queued or running in each worker
+        self._in_flight = [set[str]() for _ in range(workers)]
+        # Rate limiter stats each worker reported with its last result
+        self._limiter_stats = [None] * workers
+        self.completed = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.closed = False
+        self._restart_lock = threading.Lock()
+
+        # Always spawn, forking a process that already runs the GUI and query threads is not safe
+        self._context = multiprocessing.get_context("spawn")
+
+        # Every worker gets its share of the global rate limits
+        self._config = Config().config.copy()
+        for key in ("rate_limit_packets_per_second", "rate_limit_bytes_per_second",
+                    "rate_limit_inbound_bytes_per_second"):
+            self._config[key] = self._config[key] / workers
+
+        # Task queue, read end of the results pipe and process of each worker
+        self._tasks = [None] * workers
+        self._results = [None] * workers
+        self._processes = [None] * workers
+        for shard in range(workers):
+            self._start_worker(shard)
+
+        self._collector_thread = threading.Thread(target=self._collect, daemon=True)
+        self._collector_thread.start()
+
+    def shard(self, address) -> int:
+        """
+        Get the index of the worker that owns the given address
+        :param address:  str address
+        :return:  int worker index
+        """
+        ip = address.rsplit(":", 1)[0]
+        return zlib.crc32(ip.encode()) % self.workers
+
+    def submit(self, address) -> bool:
+        """
+        Queue a query for the given address in the worker that owns it, unless it's in flight or the worker is full
+        :param address:  str address
+        :return:  bool whether the query was queued
+        """
+        shard = self.shard(address)
+        with self._lock:
+            in_flight = self._in_flight[shard]
+            if address in in_flight:
+                self.skipped += 1
+                queued = False
+            elif len(in_flight) >= self._shard_limit:
+                self.rejected += 1
+                queued = False
+            else:
+                in_flight.add(address)
+                queued = True
+                tasks = self._tasks[shard]
+
+        if queued:
+            tasks.put(address)
+        elif not self._processes[shard].is_alive():
+            # A dead worker never answers, its servers would stay in flight for good
+            self._restart(shard)
+        return queued
+
+    def backlog(self) -> float:
+        """
+        Get the largest rate limiter backlog of the workers with queries in flight. The workers do the rate limiting,
+        so the limiter of the main process is never charged in this mode.
+        :return:  float seconds
+        """
+        with self._lock:
+            return max((stats["backlog"] for stats, in_flight in zip(self._limiter_stats, self._in_flight)
+                        if stats and in_flight), default=0.0)
+
+    def limiter_stats(self) -> dict:
+        """
+        Get the rate limiter stats of all the workers together, with the same fields as RateLimiter.stats
+        :return:  dict with pending, acquired, delayed, wait_total, average_wait, max_wait and backlog
+        """
+        backlog = self.backlog()
+        with self._lock:
+            reported = [stats for stats in self._limiter_stats if stats]
+        acquired = sum(stats["acquired"] for stats in reported)
+        wait_total = sum(stats["wait_total"] for stats in reported)
+        return {
+            "pending": sum(stats["pending"] for stats in reported),
+            "acquired": acquired,
+            "delayed": sum(stats["delayed"] for stats in reported),
+            "wait_total": wait_total,
+            "average_wait": wait_total / acquired if acquired else 0.0,
+            "max_wait": max((stats["max_wait"] for stats in reported), default=0.0),
+            "backlog": backlog,
+        }
+
+    def stats(self) -> dict:
+        """
+        Get the utilization of the workers, with the same fields as RefreshPool.stats
+        :return:  dict with workers, running, queued, utilization, completed, skipped and rejected
+        """
+        with self._lock:
+            running = sum(min(len(in_flight), WORKER_THREADS) for in_flight in self._in_flight)
+            queued = sum(len(in_flight) for in_flight in self._in_flight) - running
+            return {
+                "workers": self.workers * WORKER_THREADS,
+                "running": running,
+                "queued": queued,
+                "utilization": running / (self.workers * WORKER_THREADS),
+                "completed": self.completed,
+                "skipped": self.skipped,
+                "rejected": self.rejected,
+            }
+
+    def close(self) -> None:
+        """
+        Stop all the worker processes
+        :return:
+        """
+        self.closed = True
+        for tasks in self._tasks:
+            tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=2)
+        # Wait for the collector, so it's not reading the pipes while the interpreter tears them down
+        self._collector_thread.join(timeout=2)
+
+    def _start_worker(self, shard) -> None:
+        """
+        Start the worker process of a shard, with new queues
+        :param shard:  int worker index
+        :return:
+        """
+        tasks = self._context.Queue()
+        reader, writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_worker_main, args=(self._config, tasks, writer), daemon=True)
+        process.start()
+        # Only the worker writes, so the pipe reports the end of file when it dies
+        writer.close()
+        with self._lock:
+            self._tasks[shard] = tasks
+            self._results[shard] = reader
+            self._processes[shard] = process
+
+    def _restart(self, shard) -> None:
+        """
+        Replace a worker process that died, with a new task queue, dropping the queries it had in flight
+        :param shard:  int worker index
+        :return:
+        """
+        with self._restart_lock:
+            if self.closed or self._processes[shard].is_alive():
+                return
+
+            print(f"Query worker {shard} died with exit code {self._processes[shard].exitcode}, restarting it")
+            old_tasks = self._tasks[shard]
+            self._start_worker(shard)
+            with self._lock:
+                self._in_flight[shard].clear()
+                self._limiter_stats[shard] = None
+            # Nobody reads the old queue anymore, don't wait for its buffered tasks at exit. The old results pipe is
+            # closed by the collector when it reads its end of file.
+            old_tasks.cancel_join_thread()
+            old_tasks.close()
+
+    def _collect(self) -> None:
+        """
+        Read the results from the workers and hand them to the callback, until the pool is closed
+        :return:
+        """
+        readers = set()
+        while not self.closed:
+            with self._lock:
+                readers.update(reader for reader in self._results if not reader.closed)
+            for reader in multiprocessing.connection.wait(readers, COLLECT_TIMEOUT):
+                try:
+                    result, limiter_stats = reader.recv()
+                except (EOFError, OSError):
+                    # The worker died, it's restarted on the next submit to its shard
+                    readers.discard(reader)
+                    reader.close()
+                    continue
+                self._apply_result(result, limiter_stats)
+        for reader in readers:
+            reader.close()
+
+    def _apply_result(self, result, limiter_stats) -> None:
+        """
+        Hand a result to the callback and take its address out of the in flight ones
+        :param result:  tuple (address, info, players, rules, query_delay)
+        :param limiter_stats:  dict RateLimiter.stats of the worker
+        :return:
+        """
+        try:
+            self._on_result(*result)
+        except Exception as e:
+            print("Error applying query result:", e)
+        finally:
+            address = result[0]
+            shard = self.shard(address)
+            with self._lock:
+                self._in_flight[shard].discard(address)
+                self._limiter_stats[shard] = limiter_stats
+                self.completed += 1
@@ -0,0 +1,148 @@
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+from package.network.stream import QueryStream, Transport
+
+MAGIC = b"YADASCAP\x02"
+# Record header: seconds since the start of the capture, direction, host length, port and payload length. The host,
+# an ip or a hostname, follows the header, and then the payload.
+RECORD = struct.Struct("<dBBHH")
+SENT = 0
+RECEIVED = 1
+
+
+class CaptureWriter:
+    """
+    Writes the packets of all the queries to a binary capture file, with their timestamps
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._start = time.monotonic()
+
+    def write_sent(self, address, packet) -> None:
+        self._write(SENT, address, packet)
+
+    def write_received(self, address, packet) -> None:
+        self._write(RECEIVED, address, packet)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def _write(self, direction, address, packet) -> None:
+        """
+        Write a packet record
+        :param direction:  int SENT or RECEIVED
+        :param address:  tuple (ip, port)
+        :param packet:  bytes raw packet
+        :return:
+        """
+        host = address[0].encode()
+        header = RECORD.pack(time.monotonic() - self._start, direction, len(host), address[1], len(packet))
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(header + host + packet)
+
+
+def read_capture(path):
+    """
+    Read the records of a capture file
+    :param path:  str path to the capture file
+    :return:  generator of (timestamp, direction, (ip, port), packet)
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+
+        while header := f.read(RECORD.size):
+            timestamp, direction, host_length, port, length = RECORD.unpack(header)
+            host = f.read(host_length).decode()
+            yield timestamp, direction, (host, port), f.read(length)
+
+
+class ReplayTransport(Transport):
+    """
+    Opens streams that answer the queries with the packets of a capture instead of the network. Each server replays
+    its recorded exchanges in order, with the recorded response times divided by the speed, and starts over when it
+    runs out of them. The queries still follow the refresh schedule, only the response times are scaled.
+    """
+
+    def __init__(self, path, speed=1.0):
+        self.speed = speed
+        self._lock = threading.Lock()
+        # Address -> deque of exchanges, each a list of the responses to a request as (delay after it, packet)
+        self._exchanges = dict[tuple[str, int], deque]()
+
+        sent_at = {}
+        for timestamp, direction, address, packet in read_capture(path):
+            exchanges = self._exchanges.setdefault(address, deque())
+            if direction == SENT:
+                sent_at[address] = timestamp
+                exchanges.append([])
+            elif exchanges:
+                exchanges[-1].append((timestamp - sent_at[address], packet))
+
+    def addresses(self) -> list[str]:
+        """
+        Get the addresses of the servers in the capture
+        :return:  list of str ip:port
+        """
+        return [f"{ip}:{port}" for ip, port in self._exchanges]
+
+    def open(self, address, timeout) -> QueryStream:
+        return ReplayStream(self, address, timeout)
+
+    def next_exchange(self, address) -> list:
+        """
+        Get the recorded responses to the next request of a server
+        :param address:  tuple (ip, port)
+        :return:  list of (delay after the request, packet), empty if there was no response
+        """
+        with self._lock:
+            exchanges = self._exchanges.get(address)
+            if not exchanges:
+                return []
+            exchanges.rotate(-1)
+            return exchanges[-1]
+
+
+class ReplayStream(QueryStream):
+    """
+    Stream that answers with the packets of a capture. It doesn't use the network, so it isn't rate limited and
+    replays as fast as the replay speed allows.
+    """
+    rate_limited = False
+
+    def __init__(self, transport, address, timeout):
+        self.address = address
+        self.capture = None
+        self.query_delay = 0.0
+        self._received_at_ns = None
+        self._transport = transport
+        self._timeout = timeout
+        self._responses = deque()
+        self._sent_at = None
+
+    def close(self) -> None:
+        pass
+
+    def _sendto(self, packet) -> None:
+        self._responses = deque(self._transport.next_exchange(self.address))
+
+    def _recvfrom(self) -> bytes:
+        speed = self._transport.speed
+        if not self._responses:
+            time.sleep(self._timeout / speed)
+            raise socket.timeout("timed out")
+
+        delay, packet = self._responses.popleft()
+        remaining = self._sent_at + delay / speed - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return packet
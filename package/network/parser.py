@@ -0,0 +1,169 @@
+import struct
+from typing import NamedTuple
+
+from a2s.defaults import DEFAULT_ENCODING
+from a2s.exceptions import BrokenMessageError
+
+A2S_INFO_RESPONSE = 0x49
+A2S_INFO_RESPONSE_LEGACY = 0x6D
+A2S_PLAYER_RESPONSE = 0x44
+
+# Fixed size parts of the responses
+SOURCE_COUNTS = struct.Struct("<HBBB")  # app id, players, max players, bots
+GOLDSRC_COUNTS = struct.Struct("<BBB")  # players, max players, protocol
+GOLDSRC_MOD = struct.Struct("<LLbb")  # version, size, multiplayer only, uses custom dll
+PLAYER = struct.Struct("<lf")  # score, duration
+FLAGS = struct.Struct("<bb")  # password, vac
+
+
+class ServerInfo(NamedTuple):
+    """
+    The server information fields used by GameServer
+    """
+    server_name: str
+    map_name: str
+    folder: str
+    game: str
+    player_count: int
+    max_players: int
+    password_protected: bool
+    vac_enabled: bool
+    ping: float
+
+
+class Player(NamedTuple):
+    """
+    A player in the player list
+    """
+    name: str
+    score: int
+    duration: float
+
+
+def _read_cstring(data, view, offset, encoding) -> tuple[str, int]:
+    """
+    Read a null terminated string, decoding it straight from the buffer
+    :param data:  bytes buffer
+    :param view:  memoryview of the buffer
+    :param offset:  int offset of the string
+    :param encoding:  str encoding
+    :return:  tuple (string, offset after the null terminator)
+    """
+    end = data.find(b"\0", offset)
+    if end == -1:
+        raise BrokenMessageError("Unterminated string")
+    return str(view[offset:end], encoding, "replace"), end + 1
+
+
+def parse_info(data, ping, encoding=DEFAULT_ENCODING) -> ServerInfo:
+    """
+    Parse an A2S_INFO response, Source or GoldSrc
+    :param data:  bytes response without the packet header, starting with the response type
+    :param ping:  float seconds it took to get the response
+    :param encoding:  str encoding of the strings
+    :return:  ServerInfo
+    """
+    view = memoryview(data)
+    try:
+        if data[0] == A2S_INFO_RESPONSE:
+            # Skip the response type and the protocol version
+            name, offset = _read_cstring(data, view, 2, encoding)
+            map_name, offset = _read_cstring(data, view, offset, encoding)
+            folder, offset = _read_cstring(data, view, offset, encoding)
+            game, offset = _read_cstring(data, view, offset, encoding)
+            _, player_count, max_players, _ = SOURCE_COUNTS.unpack_from(data, offset)
+            # Skip the counts, server type and platform
+            password, vac = FLAGS.unpack_from(data, offset + SOURCE_COUNTS.size + 2)
+        elif data[0] == A2S_INFO_RESPONSE_LEGACY:
+            # Skip the response type and the address
+            offset = data.index(b"\0", 1) + 1
+            name, offset = _read_cstring(data, view, offset, encoding)
+            map_name, offset = _read_cstring(data, view, offset, encoding)
+            folder, offset = _read_cstring(data, view, offset, encoding)
+            game, offset = _read_cstring(data, view, offset, encoding)
+            player_count, max_players, _ = GOLDSRC_COUNTS.unpack_from(data, offset)
+            # Skip the counts, server type and platform
+            offset += GOLDSRC_COUNTS.size + 2
+            password, is_mod = FLAGS.unpack_from(data, offset)
+            offset += FLAGS.size
+
+            # Some games don't send the mod section
+            if is_mod and len(data) - offset > 2:
+                offset = data.index(b"\0", offset) + 1  # Website
+                offset = data.index(b"\0", offset) + 1  # Download link
+                offset += 1 + GOLDSRC_MOD.size  # Null byte and mod details
+            vac = data[offset]
+        else:
+            raise BrokenMessageError("Invalid response type: " + hex(data[0]))
+    except (struct.error, IndexError, ValueError) as e:
+        raise BrokenMessageError("Truncated info response") from e
+
+    return ServerInfo(name, map_name, folder, game, player_count, max_players, bool(password), bool(vac), ping)
+
+
+def parse_players(data, encoding=DEFAULT_ENCODING) -> list[Player]:
+    """
+    Parse an A2S_PLAYER response
+    :param data:  bytes response without the packet header, starting with the response type
+    :param encoding:  str encoding of the names
+    :return:  list of Player
+    """
+    if data[0] != A2S_PLAYER_RESPONSE:
+        raise BrokenMessageError("Invalid response type: " + hex(data[0]))
+
+    view = memoryview(data)
+    players = []
+    try:
+        offset = 2
+        for _ in range(data[1]):
+            # Skip the index, it's always 0
+            name, offset = _read_cstring(data, view, offset + 1, encoding)
+            score, duration = PLAYER.unpack_from(data, offset)
+            offset += PLAYER.size
+            players.append(Player(name, score, duration))
+    except (struct.error, IndexError) as e:
+        raise BrokenMessageError("Truncated player response") from e
+
+    return players
+
+
+def benchmark(iterations=20000) -> None:
+    """
+    Compare the speed of the parser with python-a2s for a sample of responses. The output is checked against
+    python-a2s in tests/test_parser.py.
+    :param iterations:  int times each response is parsed
+    :return:
+    """
+    import io
+    import timeit
+
+    from a2s.byteio import ByteReader
+    from a2s.info import InfoProtocol
+    from a2s.players import PlayersProtocol
+
+    source_info = (b"\x49\x11Sample Server \xe2\x98\x85\0de_dust2\0cstrike\0Counter-Strike: Source\0"
+                   b"\xf0\x00\x12\x20\x00dl\x00\x01" b"1.0.0.0\0" b"\xa0\x87\x69" b"tags,here\0")
+    goldsrc_info = (b"\x6d127.0.0.1:27015\0Old Server\0crossfire\0valve\0Half-Life\0"
+                    b"\x05\x10\x2fdl\x01\x01" b"http://mod\0http://dl\0\0" b"\x01\0\0\0\x00\x10\0\0\x01\x00"
+                    b"\x01\x00")
+    players = b"\x44\x40" + b"".join(b"\0" + f"Player {i} é".encode() + b"\0" + PLAYER.pack(i * 7, i * 13.25)
+                                     for i in range(64))
+
+    def a2s_parse(data, protocol):
+        reader = ByteReader(io.BytesIO(data), endian="<", encoding=DEFAULT_ENCODING)
+        return protocol.deserialize_response(reader, reader.read_uint8(), 0.05)
+
+    cases = [
+        ("A2S_INFO (Source)", source_info, InfoProtocol, lambda: parse_info(source_info, 0.05)),
+        ("A2S_INFO (GoldSrc)", goldsrc_info, InfoProtocol, lambda: parse_info(goldsrc_info, 0.05)),
+        ("A2S_PLAYER (64 players)", players, PlayersProtocol, lambda: parse_players(players)),
+    ]
+    for name, data, protocol, parse in cases:
+        a2s_time = timeit.timeit(lambda: a2s_parse(data, protocol), number=iterations)
+        own_time = timeit.timeit(parse, number=iterations)
+        print(f"{name}: python-a2s {a2s_time / iterations * 1e6:.1f} us, "
+              f"parser {own_time / iterations * 1e6:.1f} us ({a2s_time / own_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from package.utils.export import iter_records
+
+# Seconds between the delta batches sent to each client
+PUSH_BATCH_INTERVAL = 0.25
+# Seconds without changes after which a comment is sent, to detect closed connections
+PUSH_KEEPALIVE_INTERVAL = 15
+# Record fields sent for each changed field of GameServer.fill_data. The latency statistics change with the ping.
+DELTA_FIELDS = {
+    "ping": ["ping", "jitter", "ping_p50", "ping_p95", "ping_p99", "loss"],
+    "players": ["player_count", "players"],
+    "timeout_count": ["ping"],
+    "latency_stats": ["jitter", "ping_p50", "ping_p95", "ping_p99", "loss"],
+}
+# Pending marker of a server that has to be sent whole, because it was added or its changes are unknown
+FULL = "FULL"
+# Pending marker of a removed server
+DELETED = "DELETED"
+
+
+class PushClient:
+    """
+    Changes pending to be sent to a client. Changes of the same server are merged until they are sent, so a slow
+    client only delays itself and its pending data never grows beyond one entry per server.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # Address -> set of changed record fields, FULL or DELETED
+        self._pending = dict[str, object]()
+
+    def add(self, event, address, changes) -> None:
+        """
+        Merge a server list change into the pending changes
+        :param event:  str "ADD", "UPDATE", "DELETE"
+        :param address:  str address
+        :param changes:  dict of changed fields, None if unknown
+        :return:
+        """
+        if event == "UPDATE" and changes is not None:
+            fields = {record_field for field in changes for record_field in DELTA_FIELDS.get(field, [field])}
+            if not fields:
+                return
+        else:
+            fields = DELETED if event == "DELETE" else FULL
+
+        with self._condition:
+            pending = self._pending.get(address)
+            if isinstance(fields, set) and isinstance(pending, set):
+                pending |= fields
+            elif isinstance(fields, set) and pending is not None:
+                # Updated after being added or removed, send it whole
+                self._pending[address] = FULL
+            else:
+                self._pending[address] = fields
+            self._condition.notify()
+
+    def take(self, timeout) -> dict[str, object]:
+        """
+        Wait for pending changes and take them all
+        :param timeout:  float seconds to wait
+        :return:  dict of address -> set of changed record fields, FULL or DELETED. Empty on timeout.
+        """
+        with self._condition:
+            if not self._pending:
+                self._condition.wait(timeout)
+            pending, self._pending = self._pending, {}
+            return pending
+
+
+class PushRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the server list changes as Server-Sent Events on /events: a "snapshot" event with every server first, and
+    then "delta" events with the changed fields of each server, null for removed servers.
+    """
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/events":
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        push_server = self.server.push_server
+        client = PushClient()
+        # Register before the snapshot, so no change is lost in between
+        push_server.add_client(client)
+        try:
+            manager = push_server.server_manager
+            self._send_event("snapshot", list(iter_records(manager.get_servers())))
+
+            last_sent = time.monotonic()
+            while not push_server.closed:
+                time.sleep(PUSH_BATCH_INTERVAL)
+                pending = client.take(PUSH_KEEPALIVE_INTERVAL)
+                if pending:
+                    self._send_event("delta", push_server.build_delta(pending))
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= PUSH_KEEPALIVE_INTERVAL:
+                    self.wfile.write(b":\n\n")
+                    self.wfile.flush()
+                    last_sent = time.monotonic()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            push_server.remove_client(client)
+
+    def _send_event(self, event, data) -> None:
+        """
+        Send a Server-Sent Event
+        :param event:  str event name
+        :param data:  JSON serializable data
+        :return:
+        """
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode())
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        # Don't log every request to stderr
+        pass
+
+
+class PushServer:
+    """
+    Local HTTP server pushing the server list changes to other tools, so they don't have to query the servers again
+    """
+
+    def __init__(self, server_manager, port, host="127.0.0.1"):
+        self.server_manager = server_manager
+        self.closed = False
+        self._clients_lock = threading.Lock()
+        self._clients = list[PushClient]()
+
+        self._httpd = ThreadingHTTPServer((host, port), PushRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.push_server = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        """
+        Start serving and listening to the server list changes
+        :return:
+        """
+        self.server_manager.on_update(self.on_server_list_change)
+        self._thread.start()
+
+    def close(self) -> None:
+        """
+        Stop serving
+        :return:
+        """
+        self.closed = True
+        self.server_manager.remove_listener(self.on_server_list_change)
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def add_client(self, client) -> None:
+        with self._clients_lock:
+            self._clients.append(client)
+
+    def remove_client(self, client) -> None:
+        with self._clients_lock:
+            self._clients.remove(client)
+
+    def on_server_list_change(self, servers, event, address, changes) -> None:
+        """
+        Queue a server list change for every client. Called from the query threads, so it only merges the change.
+        :param servers:  ServerManager
+        :param event:  str "ADD", "UPDATE", "DELETE"
+        :param address:  str address
+        :param changes:  dict of changed fields, None if unknown
+        :return:
+        """
+        with self._clients_lock:
+            clients = self._clients.copy()
+        for client in clients:
+            client.add(event, address, changes)
+
+    def build_delta(self, pending) -> dict[str, dict]:
+        """
+        Build the delta event data from the pending changes of a client, with the current values of the servers
+        :param pending:  dict of address -> set of changed record fields, FULL or DELETED
+        :return:  dict of address -> dict of changed fields, None for removed servers
+        """
+        delta = {}
+        for address, fields in pending.items():
+            server = self.server_manager.get_server_by_address(address)
+            if fields == DELETED or server is None:
+                delta[address] = None
+                continue
+
+            record = next(iter_records([server]))
+            delta[address] = record if fields == FULL else {field: record[field] for field in fields if field in record}
+        return delta
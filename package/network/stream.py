@@ -0,0 +1,233 @@
+import socket
+import struct
+import sys
+import time
+
+from a2s.a2s_fragment import decode_fragment
+from a2s.defaults import DEFAULT_RETRIES
+from a2s.exceptions import BrokenMessageError
+
+from package.network.parser import parse_info, parse_players, ServerInfo, Player
+from package.singleton.ratelimiter import RateLimiter
+
+HEADER_SIMPLE = b"\xFF\xFF\xFF\xFF"
+HEADER_MULTI = b"\xFE\xFF\xFF\xFF"
+A2S_CHALLENGE_RESPONSE = 0x41
+A2S_INFO_REQUEST = b"\x54Source Engine Query\0"
+A2S_PLAYER_REQUEST = b"\x55"
+# Kernel receive timestamps. Python doesn't export the option, on Linux it's 35 on all common architectures.
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35 if sys.platform.startswith("linux") else None)
+# struct timespec, as sent in the SCM_TIMESTAMPNS control message
+TIMESPEC = struct.Struct("@ll")
+
+
+class QueryStream:
+    """
+    UDP stream to query one server. Every packet goes through the rate limiter, and is written to the capture if
+    there is one.
+    """
+    # Whether the packets go through the rate limiter, streams that don't use the network skip it
+    rate_limited = True
+
+    def __init__(self, address, timeout, capture=None):
+        self.address = address
+        self.capture = capture
+        # Seconds the packets of this stream waited in the rate limiter
+        self.query_delay = 0.0
+        # Monotonic and wall clock time of the last packet sent, and times of the last packet received
+        self._sent_at = None
+        self._sent_at_ns = None
+        self._received_at = None
+        self._received_at_ns = None
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.settimeout(timeout)
+
+        # Ask the kernel to timestamp the received packets (Linux only), so the ping doesn't include the time the
+        # packet waited for this thread to be scheduled
+        self._kernel_timestamps = False
+        if SO_TIMESTAMPNS is not None and hasattr(self._socket, "recvmsg"):
+            try:
+                self._socket.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+                self._kernel_timestamps = True
+            except OSError:
+                pass
+
+    def info(self) -> ServerInfo:
+        """
+        Request the server information
+        :return:  ServerInfo
+        """
+        data, ping = self._challenge_request(lambda challenge: A2S_INFO_REQUEST + challenge)
+        return parse_info(data, ping)
+
+    def players(self) -> list[Player]:
+        """
+        Request the player list
+        :return:  list of Player
+        """
+        data, _ = self._challenge_request(lambda challenge: A2S_PLAYER_REQUEST + (challenge or b"\0\0\0\0"))
+        return parse_players(data)
+
+    def _challenge_request(self, serialize) -> tuple[bytes, float]:
+        """
+        Send a request, repeating it with the challenge while the server answers with one
+        :param serialize:  function that builds the request from the bytes challenge, empty for the first request
+        :return:  tuple (bytes response, float seconds it took to get the first response)
+        """
+        challenge = b""
+        ping = None
+        for _ in range(DEFAULT_RETRIES + 1):
+            data = self.request(serialize(challenge))
+            if ping is None:
+                ping = self._round_trip_time()
+
+            if not data:
+                raise BrokenMessageError("Empty response")
+            if data[0] != A2S_CHALLENGE_RESPONSE:
+                return data, ping
+            challenge = data[1:5]
+
+        raise BrokenMessageError("Server keeps sending challenge responses")
+
+    def request(self, payload) -> bytes:
+        """
+        Send a request and wait for its response
+        :param payload:  bytes request without the packet header
+        :return:  bytes response without the packet header
+        """
+        self.send(payload)
+        return self.recv()
+
+    def send(self, data) -> None:
+        """
+        Send a single packet request
+        :param data:  bytes request without the packet header
+        :return:
+        """
+        packet = HEADER_SIMPLE + data
+        if self.rate_limited:
+            self.query_delay += RateLimiter().acquire(self.address[0], len(packet))
+        self._received_at_ns = None
+        self._sent_at = time.monotonic()
+        self._sent_at_ns = time.time_ns()
+        self._sendto(packet)
+        if self.capture:
+            self.capture.write_sent(self.address, packet)
+
+    def recv(self) -> bytes:
+        """
+        Receive a response, reassembling it if it's split in several packets
+        :return:  bytes response without the packet header
+        """
+        packet = self._recv_packet()
+        header = packet[:4]
+        data = packet[4:]
+        if header == HEADER_SIMPLE:
+            return data
+        elif header == HEADER_MULTI:
+            fragments = [decode_fragment(data)]
+            while len(fragments) < fragments[0].fragment_count:
+                fragments.append(decode_fragment(self._recv_packet()[4:]))
+            fragments.sort(key=lambda f: f.fragment_id)
+            reassembled = b"".join(fragment.payload for fragment in fragments)
+            # Sometimes there's an additional header present
+            if reassembled.startswith(HEADER_SIMPLE):
+                reassembled = reassembled[4:]
+            return reassembled
+        else:
+            raise BrokenMessageError("Invalid packet header: " + repr(header))
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def _round_trip_time(self) -> float:
+        """
+        Get the time between the last packet sent and the last packet received. It's measured from the moment the
+        packet was sent, not counting the wait in the rate limiter, to the kernel receive timestamp if there is one.
+        :return:  float seconds
+        """
+        measured = self._received_at - self._sent_at
+        if self._received_at_ns is not None:
+            # The kernel timestamp is on the wall clock. Ignore it if the clock jumped in between.
+            rtt = (self._received_at_ns - self._sent_at_ns) / 1e9
+            if 0 <= rtt <= measured:
+                return rtt
+        return measured
+
+    def _recv_packet(self) -> bytes:
+        """
+        Receive a single packet, accounting for it in the rate limiter and the capture
+        :return:  bytes packet
+        """
+        packet = self._recvfrom()
+        self._received_at = time.monotonic()
+        if self.rate_limited:
+            RateLimiter().consume(len(packet))
+        if self.capture:
+            self.capture.write_received(self.address, packet)
+        return packet
+
+    def _sendto(self, packet) -> None:
+        self._socket.sendto(packet, self.address)
+
+    def _recvfrom(self) -> bytes:
+        if not self._kernel_timestamps:
+            return self._socket.recv(65535)
+
+        packet, ancdata, _, _ = self._socket.recvmsg(65535, socket.CMSG_SPACE(TIMESPEC.size))
+        for level, kind, data in ancdata:
+            # SCM_TIMESTAMPNS has the same value as the option
+            if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+                seconds, nanoseconds = TIMESPEC.unpack(data[:TIMESPEC.size])
+                self._received_at_ns = seconds * 1_000_000_000 + nanoseconds
+        return packet
+
+
+class Transport:
+    """
+    Opens the streams used to query servers, over the network
+    """
+
+    def open(self, address, timeout) -> QueryStream:
+        """
+        Open a stream to a server
+        :param address:  tuple (ip, port)
+        :param timeout:  float seconds to wait for each response
+        :return:  QueryStream
+        """
+        return QueryStream(address, timeout)
+
+
+class RecordingTransport(Transport):
+    """
+    Opens streams over the network that write all their packets to a capture
+    """
+
+    def __init__(self, capture):
+        self.capture = capture
+
+    def open(self, address, timeout) -> QueryStream:
+        return QueryStream(address, timeout, self.capture)
+
+
+_transport = Transport()
+
+
+def set_transport(transport) -> None:
+    """
+    Set the transport used for all the queries
+    :param transport:  Transport
+    :return:
+    """
+    global _transport
+    _transport = transport
+
+
+def open_stream(address, timeout) -> QueryStream:
+    """
+    Open a stream to a server with the current transport
+    :param address:  tuple (ip, port)
+    :param timeout:  float seconds to wait for each response
+    :return:  QueryStream
+    """
+    return _transport.open(address, timeout)
@@ -6,8 +6,19 @@ from package.singleton.singleton import Singleton
 class Config(metaclass=Singleton):
     def __init__(self):
         self.config: dict[str, Any] = {
-            'server_list_columns_width': [500, 300, 100, 100, 300, 100],
+            'server_list_columns_width': [500, 300, 100, 100, 300, 100, 100, 100, 100],
+            'show_latency_stats_columns': False,
+            'alert_rules': [],
+            'server_lists': [],
             'is_maximized': False,
+            'query_workers': 0,
+            'refresh_pool_workers': 64,
+            'refresh_pool_queue_size': 4096,
+            'push_api_port': 0,
+            'rate_limit_packets_per_second': 500,
+            'rate_limit_bytes_per_second': 16384,
+            'rate_limit_packets_per_second_per_ip': 50,
+            'rate_limit_inbound_bytes_per_second': 1048576,
         }
 
     def load(self, data: dict[str, Any]) -> None:
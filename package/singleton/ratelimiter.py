@@ -0,0 +1,167 @@
+import threading
+import time
+
+from package.singleton.config import Config
+from package.singleton.singleton import Singleton
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out reservations. The balance may go negative, in which case the caller has to wait
+    until the bucket refills before using the tokens it reserved.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now) -> None:
+        """
+        Add the tokens accumulated since the last update
+        :param now:  float monotonic timestamp
+        :return:
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount, now) -> float:
+        """
+        Take tokens from the bucket and return how long the caller has to wait before using them
+        :param amount:  float amount of tokens
+        :param now:  float monotonic timestamp
+        :return:  float seconds to wait
+        """
+        self.refill(now)
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def is_full(self, now) -> bool:
+        """
+        Check if the bucket has been idle long enough to be full again
+        :param now:  float monotonic timestamp
+        :return:  bool
+        """
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter(metaclass=Singleton):
+    """
+    Rate limiter for outgoing queries. Enforces global packets/sec and bytes/sec caps, plus a packets/sec cap per
+    destination ip. Responses are charged to a separate inbound bytes/sec budget, so large responses don't eat into
+    the request caps. Queries over the limit are delayed, never dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._packets = TokenBucket(Config().get("rate_limit_packets_per_second"))
+        self._bytes = TokenBucket(Config().get("rate_limit_bytes_per_second"))
+        self._inbound_bytes = TokenBucket(Config().get("rate_limit_inbound_bytes_per_second"))
+        self._per_ip_rate = Config().get("rate_limit_packets_per_second_per_ip")
+        self._per_ip = dict[str, TokenBucket]()
+
+        # Wait statistics
+        self.acquired_count = 0
+        self.delayed_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._pending = 0
+
+    def acquire(self, ip, size, packets=1) -> float:
+        """
+        Block until the given packets can be sent to the given ip.
+        :param ip:  str destination ip
+        :param size:  int bytes to send
+        :param packets:  int number of packets
+        :return:  float seconds waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._per_ip.get(ip)
+            if bucket is None:
+                bucket = self._per_ip[ip] = TokenBucket(self._per_ip_rate)
+            # Also wait for the inbound budget to recover from the responses already received
+            wait = max(self._packets.reserve(packets, now),
+                       self._bytes.reserve(size, now),
+                       bucket.reserve(packets, now),
+                       self._inbound_bytes.reserve(0, now))
+            self._record(wait)
+            self._pending += 1
+
+        try:
+            if wait > 0:
+                time.sleep(wait)
+        finally:
+            with self._lock:
+                self._pending -= 1
+        return wait
+
+    def consume(self, size) -> None:
+        """
+        Account for a response that has already been received, without waiting. Only the inbound budget is charged,
+        later queries are delayed if it runs out.
+        :param size:  int bytes received
+        :return:
+        """
+        with self._lock:
+            self._inbound_bytes.reserve(size, time.monotonic())
+
+    def backlog(self) -> float:
+        """
+        Get how long a query issued now would have to wait because of the global caps
+        :return:  float seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            buckets = (self._packets, self._bytes, self._inbound_bytes)
+            for bucket in buckets:
+                bucket.refill(now)
+            return max(0.0, *(-bucket.tokens / bucket.rate for bucket in buckets))
+
+    def pending(self) -> int:
+        """
+        Get the number of queries currently waiting for their turn
+        :return:  int
+        """
+        return self._pending
+
+    def average_wait(self) -> float:
+        """
+        Get the average time a query waited in the limiter
+        :return:  float seconds
+        """
+        return self.wait_total / self.acquired_count if self.acquired_count else 0.0
+
+    def stats(self) -> dict:
+        """
+        Get the wait statistics of the limiter
+        :return:  dict with pending, acquired, delayed, wait_total, average_wait, max_wait and backlog, in seconds
+        """
+        backlog = self.backlog()
+        with self._lock:
+            return {
+                "pending": self.pending(),
+                "acquired": self.acquired_count,
+                "delayed": self.delayed_count,
+                "wait_total": self.wait_total,
+                "average_wait": self.average_wait(),
+                "max_wait": self.wait_max,
+                "backlog": backlog,
+            }
+
+    def _record(self, wait) -> None:
+        """
+        Record the wait time of a query. Also drops idle per ip buckets so the table doesn't keep growing.
+        :param wait:  float seconds
+        :return:
+        """
+        self.acquired_count += 1
+        if wait > 0:
+            self.delayed_count += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+        if len(self._per_ip) > 4096:
+            now = time.monotonic()
+            self._per_ip = {ip: bucket for ip, bucket in self._per_ip.items() if not bucket.is_full(now)}
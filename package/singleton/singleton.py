@@ -1,7 +1,14 @@
+import threading
+
+
 class Singleton(type):
     _instances = {}
+    # Instances may be created from several threads at once, and may create other singletons while being created
+    _lock = threading.RLock()
 
     def __call__(cls, *args, **kwargs):
         if cls not in cls._instances:
-            cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
+            with cls._lock:
+                if cls not in cls._instances:
+                    cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
@@ -1,26 +1,34 @@
 import asyncio
+import threading
 
 from PyQt6 import QtWidgets
-from PyQt6.QtCore import Qt, QModelIndex
-from PyQt6.QtGui import QAction
-from PyQt6.QtWidgets import QWidget, QMessageBox, QTableWidgetItem
+from PyQt6.QtCore import Qt, QModelIndex, QTimer, pyqtSignal
+from PyQt6.QtGui import QAction, QActionGroup
+from PyQt6.QtWidgets import QWidget, QMessageBox, QTableWidgetItem, QSystemTrayIcon, QApplication
 
-from package.consts.consts import APP_NAME
+from package.consts.consts import APP_NAME, DEFAULT_SERVER_LIST
 from package.enums.latencyenum import LatencyEnum
+from package.models.aggregates import format_summary
 from package.models.gameserver import GameServer
-from package.models.servermanager import ServerManager
 from package.singleton.config import Config
 from package.ui.main_window_ui import Ui_MainWindow
-from package.ui.server_table_model import ServerTableModel
-from package.utils.utils import float_to_hhmmss
+from package.ui.server_table_model import ServerTableModel, LATENCY_STATS_COLUMNS
+from package.utils.export import export_servers
+from package.utils.utils import float_to_hhmmss, format_ms, format_percentage
 
 
 class MainWindow(QWidget, Ui_MainWindow):
     """
     Main window class for the YADAS application.
     """
-
-    def __init__(self):
+    # Server list changes, delivered to the GUI thread: event, address, changes
+    server_list_changed = pyqtSignal(str, str, object)
+    # Alerts, delivered to the GUI thread: event, rule name, address
+    alert_changed = pyqtSignal(str, str, str)
+    # Export results, delivered to the GUI thread: message
+    export_finished = pyqtSignal(str)
+
+    def __init__(self, server_manager):
         super().__init__()
 
         # Load the UI file
@@ -33,16 +41,19 @@ class MainWindow(QWidget, Ui_MainWindow):
         if Config().get("is_maximized"):
             self.showMaximized()
 
-        # Create a server manager instance
-        self.server_manager = ServerManager.load()
+        # Keep the server manager instance
+        self.server_manager = server_manager
 
         # Create the server table model
-        server_table_model = ServerTableModel(self.server_manager.get_servers())
+        server_table_model = ServerTableModel(self.server_manager.get_list_servers())
         self.serverTable.setModel(server_table_model)
+        # Whether a rebuild of the whole table is already scheduled
+        self._table_update_pending = False
         self.serverTable.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.serverTable.customContextMenuRequested.connect(self.on_server_table_context_menu)
         self.serverTable.show()
         self.set_server_table_column_widths()
+        self.set_latency_stats_columns_visible(Config().get("show_latency_stats_columns"))
 
         # Set default visible columns width for the players table
         header = self.serverPlayers.horizontalHeader()
@@ -60,12 +71,29 @@ class MainWindow(QWidget, Ui_MainWindow):
         self.latencyGraph.setMouseEnabled(False, False)
         self.latencyGraph.setMenuEnabled(False)
 
+        # Report the visible rows of the table, so they are refreshed more often than the rest
+        self.serverTable.verticalScrollBar().valueChanged.connect(self.update_visible_servers)
+        self.serverTable.verticalScrollBar().rangeChanged.connect(self.update_visible_servers)
+        server_table_model.layoutChanged.connect(self.update_visible_servers)
+
         # Trigger click row event from table
         self.serverTable.selectionModel().currentRowChanged.connect(self.on_server_table_row_changed)
 
-        # Observe the server manager for changes
+        # Observe the server manager for changes. The server manager notifies from the query threads, so the
+        # changes are handled through a signal in the GUI thread.
+        self.server_list_changed.connect(self.apply_server_list_change)
         self.server_manager.on_update(self.on_server_list_change)
 
+        # Show the alerts as tray notifications, when the system has a tray
+        self.tray_icon = None
+        if self.server_manager.alerts.rules and QSystemTrayIcon.isSystemTrayAvailable():
+            self.tray_icon = QSystemTrayIcon(QApplication.windowIcon(), self)
+            self.tray_icon.show()
+        self.alert_changed.connect(self.show_alert)
+        self.server_manager.alerts.on_alert(self.alert_changed.emit)
+
+        self.export_finished.connect(lambda message: QMessageBox.information(self, APP_NAME, message))
+
     def keyPressEvent(self, event):
         """
         Handle the key press event for the main window.
@@ -82,14 +110,16 @@ class MainWindow(QWidget, Ui_MainWindow):
 
             server = GameServer(text)
 
-            if self.server_manager.get_server_by_ip_port(server.ip, server.port):
+            if self.server_manager.has_server(str(server)):
                 # Create popup to show that the server already exists
                 QMessageBox.information(self, APP_NAME, "Server has already been added to the server list.")
                 return
 
-            if server.is_valid():
-                server.refresh()
-                self.server_manager.add_server(server)
+            # Checked in the refresh pool, the server is added when it answers
+            if not self.server_manager.add_server_if_valid(server):
+                QMessageBox.information(self, APP_NAME, "The server is already being checked or too many servers are "
+                                                        "being refreshed, try again later.")
+                return
 
         super().keyPressEvent(event)
 
@@ -101,6 +131,7 @@ class MainWindow(QWidget, Ui_MainWindow):
         """
         self.server_manager.remove_listener(self.on_server_list_change)
         self.server_manager.save()
+        self.server_manager.close()
 
         # Cancel all async tasks
         asyncio.get_event_loop().close()
@@ -116,6 +147,15 @@ class MainWindow(QWidget, Ui_MainWindow):
         for i, width in enumerate(column_widths):
             self.serverTable.setColumnWidth(i, width)
 
+    def set_latency_stats_columns_visible(self, visible) -> None:
+        """
+        Show or hide the latency statistics columns of the server table.
+        :param visible: bool
+        :return:
+        """
+        for column in LATENCY_STATS_COLUMNS:
+            self.serverTable.setColumnHidden(column, not visible)
+
     def save_config(self) -> None:
         """
         Save the configuration to the config file.
@@ -124,6 +164,7 @@ class MainWindow(QWidget, Ui_MainWindow):
         Config().set("server_list_columns_width",
                      [self.serverTable.columnWidth(i) for i in range(self.serverTable.model().columnCount())])
         Config().set("is_maximized", self.isMaximized())
+        Config().set("show_latency_stats_columns", not self.serverTable.isColumnHidden(LATENCY_STATS_COLUMNS[0]))
 
         Config().save()
 
@@ -170,6 +211,12 @@ class MainWindow(QWidget, Ui_MainWindow):
             for address in addresses:
                 self.server_manager.remove_server(address)
 
+            # The servers still in other active lists are not notified as deleted, refresh the table here
+            if self.server_manager.selected in addresses:
+                self.server_manager.set_selected(None)
+                self.clear_server_info()
+            self.serverTable.model().update_all_data(self.server_manager.get_list_servers())
+
     def server_properties(self, address) -> None:
         """
         Display the server properties dialog for the selected server.
@@ -202,6 +249,209 @@ class MainWindow(QWidget, Ui_MainWindow):
             dialog.setLayout(layout)
             dialog.exec()
 
+    def find_player(self) -> None:
+        """
+        Display the dialog to search a player across all servers.
+        :return:
+        """
+        # Create dialog
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle("Find player")
+        dialog.resize(500, 400)
+
+        # Create layout with the search box and the results table
+        layout = QtWidgets.QVBoxLayout()
+        search = QtWidgets.QLineEdit()
+        search.setPlaceholderText("Player name, or its first letters if shorter than 3 characters")
+        layout.addWidget(search)
+        results = QtWidgets.QTableWidget(0, 2)
+        results.setHorizontalHeaderLabels(["Player", "Server"])
+        results.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeMode.Stretch)
+        results.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        results.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(results)
+
+        search.textChanged.connect(lambda text: self.fill_player_search_results(results, text))
+        results.cellDoubleClicked.connect(lambda row, column: self.select_server(results.item(row, 1).text()))
+
+        # Set layout
+        dialog.setLayout(layout)
+        dialog.exec()
+
+    def export(self) -> None:
+        """
+        Ask for a file and export the servers to it in a background thread, so the window and the refreshes are not
+        blocked while writing.
+        :return:
+        """
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export servers", "servers.jsonl",
+            "JSON Lines (*.jsonl *.jsonl.gz *.jsonl.zst);;CSV (*.csv *.csv.gz *.csv.zst);;Parquet (*.parquet)")
+        if not path:
+            return
+
+        threading.Thread(target=self._export_in_background, args=(path,), daemon=True).start()
+
+    def _export_in_background(self, path) -> None:
+        """
+        Export the servers to a file and report the result.
+        :param path: str file path
+        :return:
+        """
+        try:
+            count = export_servers(self.server_manager.get_servers(), path)
+            self.export_finished.emit(f"Exported {count} servers to {path}.")
+        except (ImportError, ValueError, OSError) as e:
+            self.export_finished.emit(f"Error exporting servers: {e}")
+
+    def open_server_list(self, list_name) -> None:
+        """
+        Show the servers of a server list in the server table.
+        :param list_name: str list name
+        :return:
+        """
+        self.server_manager.open_list(list_name)
+        self.server_manager.set_selected(None)
+        self.clear_server_info()
+        self.serverTable.model().update_all_data(self.server_manager.get_list_servers())
+
+    def new_server_list(self) -> None:
+        """
+        Ask for a name and create a new server list, showing it.
+        :return:
+        """
+        name, ok = QtWidgets.QInputDialog.getText(self, "New list", "List name:")
+        if not ok:
+            return
+
+        try:
+            self.server_manager.create_list(name.strip())
+        except ValueError as e:
+            QMessageBox.information(self, APP_NAME, str(e))
+            return
+        self.open_server_list(name.strip())
+
+    def set_server_list_refresh_interval(self) -> None:
+        """
+        Ask for the refresh interval of the current server list.
+        :return:
+        """
+        server_list = self.server_manager.get_list()
+        interval, ok = QtWidgets.QInputDialog.getInt(
+            self, "Refresh interval", "Seconds between refreshes of the servers of the list, 0 to refresh them more "
+                                      "often when visible:", int(server_list.refresh_interval or 0), 0, 86400)
+        if ok:
+            self.server_manager.set_list_refresh_interval(server_list.name, interval or None)
+
+    def delete_server_list(self) -> None:
+        """
+        Delete the current server list after confirmation, showing the default list.
+        :return:
+        """
+        name = self.server_manager.current_list
+        reply = QMessageBox.question(self, "Delete list", f"Are you sure you want to delete the list {name}?",
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        if reply == QMessageBox.StandardButton.Yes:
+            self.server_manager.delete_list(name)
+            self.open_server_list(DEFAULT_SERVER_LIST)
+
+    def fill_lists_menu(self, menu) -> None:
+        """
+        Fill the lists menu with the server lists and the actions on the current one.
+        :param menu: QMenu lists menu
+        :return:
+        """
+        menu.clear()
+        current = self.server_manager.get_list()
+
+        # One action to open each list
+        for server_list in self.server_manager.lists.values():
+            title = server_list.name if server_list.active else f"{server_list.name} (inactive)"
+            action = QAction(title, menu)
+            action.setCheckable(True)
+            action.setChecked(server_list is current)
+            action.triggered.connect(lambda checked, name=server_list.name: self.open_server_list(name))
+            self.lists_action_group.addAction(action)
+            menu.addAction(action)
+        menu.addSeparator()
+
+        # New list action
+        new_action = QAction("New list...", menu)
+        new_action.triggered.connect(self.new_server_list)
+        menu.addAction(new_action)
+
+        # Active action, inactive lists are not refreshed
+        active_action = QAction("Refresh this list", menu)
+        active_action.setCheckable(True)
+        active_action.setChecked(current.active)
+        active_action.toggled.connect(lambda active: self.server_manager.set_list_active(current.name, active))
+        menu.addAction(active_action)
+
+        # Refresh interval action
+        interval_action = QAction("Refresh interval...", menu)
+        interval_action.triggered.connect(self.set_server_list_refresh_interval)
+        menu.addAction(interval_action)
+
+        # Delete action, the default list can't be deleted
+        delete_action = QAction("Delete list", menu)
+        delete_action.setEnabled(current.name != DEFAULT_SERVER_LIST)
+        delete_action.triggered.connect(self.delete_server_list)
+        menu.addAction(delete_action)
+
+    def show_summary(self) -> None:
+        """
+        Display the dialog with the totals of the server list, updated every second.
+        :return:
+        """
+        # Create dialog
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle("Summary")
+        dialog.resize(500, 400)
+
+        # Create layout with the summary text
+        layout = QtWidgets.QVBoxLayout()
+        text = QtWidgets.QPlainTextEdit()
+        text.setReadOnly(True)
+        layout.addWidget(text)
+
+        def update_summary():
+            text.setPlainText(format_summary(self.server_manager.get_summary()))
+
+        update_summary()
+        timer = QTimer(dialog)
+        timer.timeout.connect(update_summary)
+        timer.start(1000)
+
+        # Set layout
+        dialog.setLayout(layout)
+        dialog.exec()
+
+    def fill_player_search_results(self, table, query) -> None:
+        """
+        Fill the player search results table with the players matching the query.
+        :param table: QTableWidget results table
+        :param query: str part of the player name
+        :return:
+        """
+        matches = self.server_manager.search_players(query)
+        table.setRowCount(len(matches))
+
+        for i, (name, address) in enumerate(matches):
+            table.setItem(i, 0, QTableWidgetItem(name))
+            table.setItem(i, 1, QTableWidgetItem(address))
+
+    def select_server(self, address) -> None:
+        """
+        Select the row of a server in the server table.
+        :param address: str address
+        :return:
+        """
+        model = self.serverTable.model()
+        for row in range(model.rowCount()):
+            if model.index(row, 0).data(Qt.ItemDataRole.UserRole) == address:
+                self.serverTable.selectRow(row)
+                return
+
     def save_server_properties(self, dialog, server, reserved_slots) -> None:
         """
         Save the server properties from the dialog.
@@ -215,6 +465,25 @@ class MainWindow(QWidget, Ui_MainWindow):
         self.server_manager.update_server(server)
         dialog.close()
 
+    def update_visible_servers(self) -> None:
+        """
+        Report the servers in the visible rows of the server table to the server manager.
+        :return:
+        """
+        model = self.serverTable.model()
+        first = self.serverTable.rowAt(0)
+        last = self.serverTable.rowAt(self.serverTable.viewport().height() - 1)
+
+        if first == -1:
+            self.server_manager.set_visible(set())
+            return
+        if last == -1:
+            # The table doesn't fill the viewport
+            last = model.rowCount() - 1
+
+        self.server_manager.set_visible({model.index(row, 0).data(Qt.ItemDataRole.UserRole)
+                                         for row in range(first, last + 1)})
+
     def on_server_table_row_changed(self, index: QModelIndex) -> None:
         """
         Handle the event when the selected row in the server table changes.
@@ -231,19 +500,37 @@ class MainWindow(QWidget, Ui_MainWindow):
         # Display server info
         self.display_server_info(address)
 
-    def on_server_list_change(self, servers, event, address) -> None:
+    def on_server_list_change(self, servers, event, address, changes) -> None:
         """
-        Handle the event when the server list changes.
+        Handle the event when the server list changes, from any thread.
         :param servers: list of GameServer
         :param event: str "ADD", "UPDATE", "DELETE"
         :param address: str address
+        :param changes: dict of changed fields, None if unknown
         :return:
         """
-        # Refresh the server table
-        self.serverTable.model().update_all_data(self.server_manager.get_servers())
+        self.server_list_changed.emit(event, address, changes)
+
+    def apply_server_list_change(self, event, address, changes) -> None:
+        """
+        Update the server table and the server info panel with a server list change, in the GUI thread.
+        :param event: str "ADD", "UPDATE", "DELETE"
+        :param address: str address
+        :param changes: dict of changed fields, None if unknown
+        :return:
+        """
+        # Refresh the server table. Only the row of the server is rebuilt, and only if something changed or it's the
+        # selected server, whose exact ping is refreshed every second. Added and removed servers rebuild the whole
+        # table once the events of a burst are handled, e.g. when a list with thousands of servers is activated.
+        if event != "UPDATE":
+            self.schedule_table_update()
+        if event != "DELETE" and (changes is None or changes or address == self.server_manager.selected):
+            server = self.server_manager.get_server_by_address(address)
+            if server:
+                self.serverTable.model().update_server(server)
 
         if address == self.server_manager.selected:
-            if event == "DELETE":
+            if event == "DELETE" and not self.server_manager.has_server(address):
                 # Clear the server info if the selected server is deleted and unselect it
                 self.server_manager.set_selected(None)
                 self.clear_server_info()
@@ -251,6 +538,42 @@ class MainWindow(QWidget, Ui_MainWindow):
                 # Display the server info if the selected server is updated or added
                 self.display_server_info(address)
 
+    def schedule_table_update(self) -> None:
+        """
+        Rebuild the server table from the current list once the pending events are handled, merging the rebuilds
+        requested in between.
+        :return:
+        """
+        if self._table_update_pending:
+            return
+        self._table_update_pending = True
+        QTimer.singleShot(0, self.update_table)
+
+    def update_table(self) -> None:
+        """
+        Rebuild the server table from the current list.
+        :return:
+        """
+        self._table_update_pending = False
+        self.serverTable.model().update_all_data(self.server_manager.get_list_servers())
+
+    def show_alert(self, event, rule_name, address) -> None:
+        """
+        Notify an alert that fired or cleared, in the GUI thread.
+        :param event: str "FIRED", "CLEARED"
+        :param rule_name: str name of the alert rule
+        :param address: str address
+        :return:
+        """
+        server = self.server_manager.get_server_by_address(address)
+        server_name = server.name if server and server.name else address
+        title = rule_name if event == "FIRED" else f"{rule_name} (cleared)"
+
+        if self.tray_icon:
+            self.tray_icon.showMessage(title, server_name)
+        else:
+            print(f"Alert {title}: {server_name}")
+
     def display_server_info(self, address) -> None:
         """
         Display the server information in the server info panel.
@@ -268,6 +591,11 @@ class MainWindow(QWidget, Ui_MainWindow):
             self.vacLabelVal.setText("Secure" if server.vac else "Not Secure")
             self.addressLabelVal.setText(f"<a href='steam://connect/{str(server)}'>{str(server)}</a>")
 
+            stats = server.latency_stats
+            self.jitterLabelVal.setText(format_ms(stats.jitter))
+            self.percentilesLabelVal.setText(" / ".join(format_ms(stats.percentile(p)) for p in (50, 95, 99)))
+            self.lossLabelVal.setText(format_percentage(stats.loss_rate()))
+
             self.fill_players_table(server.players)
 
             # Add a graphical representation of the server latency, using plot widget
@@ -288,6 +616,9 @@ class MainWindow(QWidget, Ui_MainWindow):
         self.passwordLabelVal.setText("")
         self.vacLabelVal.setText("")
         self.addressLabelVal.setText("")
+        self.jitterLabelVal.setText("")
+        self.percentilesLabelVal.setText("")
+        self.lossLabelVal.setText("")
         self.serverPlayers.setRowCount(0)
         self.latencyGraph.hide()
 
@@ -352,10 +683,44 @@ class MainWindow(QWidget, Ui_MainWindow):
         # File menu
         file_menu = menu_bar.addMenu("File")
 
+        # Export action
+        export_action = QAction("Export...", self)
+        export_action.triggered.connect(self.export)
+        file_menu.addAction(export_action)
+
         # Exit action
         exit_action = QAction("Exit", self)
         exit_action.triggered.connect(self.close)
         file_menu.addAction(exit_action)
 
+        # View menu
+        view_menu = menu_bar.addMenu("View")
+
+        # Latency statistics columns action
+        latency_stats_action = QAction("Latency statistics columns", self)
+        latency_stats_action.setCheckable(True)
+        latency_stats_action.setChecked(Config().get("show_latency_stats_columns"))
+        latency_stats_action.toggled.connect(self.set_latency_stats_columns_visible)
+        view_menu.addAction(latency_stats_action)
+
+        # Summary action
+        summary_action = QAction("Summary...", self)
+        summary_action.triggered.connect(self.show_summary)
+        view_menu.addAction(summary_action)
+
+        # Lists menu, filled when shown since the lists change
+        lists_menu = menu_bar.addMenu("Lists")
+        self.lists_action_group = QActionGroup(self)
+        lists_menu.aboutToShow.connect(lambda: self.fill_lists_menu(lists_menu))
+
+        # Tools menu
+        tools_menu = menu_bar.addMenu("Tools")
+
+        # Find player action
+        find_player_action = QAction("Find player...", self)
+        find_player_action.setShortcut("Ctrl+F")
+        find_player_action.triggered.connect(self.find_player)
+        tools_menu.addAction(find_player_action)
+
         # Set the menu bar
         self.layout().setMenuBar(menu_bar)
@@ -70,6 +70,27 @@ class Ui_MainWindow(object):
         self.playersLabelVal.setText("")
         self.playersLabelVal.setObjectName("playersLabelVal")
         self.gridLayout_2.addWidget(self.playersLabelVal, 3, 1, 1, 1)
+        self.jitterLabel = QtWidgets.QLabel(parent=MainWindow)
+        self.jitterLabel.setObjectName("jitterLabel")
+        self.gridLayout_2.addWidget(self.jitterLabel, 8, 0, 1, 1)
+        self.jitterLabelVal = QtWidgets.QLabel(parent=MainWindow)
+        self.jitterLabelVal.setText("")
+        self.jitterLabelVal.setObjectName("jitterLabelVal")
+        self.gridLayout_2.addWidget(self.jitterLabelVal, 8, 1, 1, 1)
+        self.percentilesLabel = QtWidgets.QLabel(parent=MainWindow)
+        self.percentilesLabel.setObjectName("percentilesLabel")
+        self.gridLayout_2.addWidget(self.percentilesLabel, 9, 0, 1, 1)
+        self.percentilesLabelVal = QtWidgets.QLabel(parent=MainWindow)
+        self.percentilesLabelVal.setText("")
+        self.percentilesLabelVal.setObjectName("percentilesLabelVal")
+        self.gridLayout_2.addWidget(self.percentilesLabelVal, 9, 1, 1, 1)
+        self.lossLabel = QtWidgets.QLabel(parent=MainWindow)
+        self.lossLabel.setObjectName("lossLabel")
+        self.gridLayout_2.addWidget(self.lossLabel, 10, 0, 1, 1)
+        self.lossLabelVal = QtWidgets.QLabel(parent=MainWindow)
+        self.lossLabelVal.setText("")
+        self.lossLabelVal.setObjectName("lossLabelVal")
+        self.gridLayout_2.addWidget(self.lossLabelVal, 10, 1, 1, 1)
         self.gridLayout.addLayout(self.gridLayout_2, 4, 1, 1, 1)
         self.serverTable = QtWidgets.QTableView(parent=MainWindow)
         self.serverTable.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
@@ -126,6 +147,9 @@ class Ui_MainWindow(object):
         self.mapLabel.setText(_translate("MainWindow", "Map"))
         self.playersLabel.setText(_translate("MainWindow", "Players"))
         self.pingLabel.setText(_translate("MainWindow", "Ping"))
+        self.jitterLabel.setText(_translate("MainWindow", "Jitter"))
+        self.percentilesLabel.setText(_translate("MainWindow", "Ping p50 / p95 / p99"))
+        self.lossLabel.setText(_translate("MainWindow", "Packet loss"))
         self.serverPlayers.setSortingEnabled(True)
         item = self.serverPlayers.horizontalHeaderItem(0)
         item.setText(_translate("MainWindow", "Name"))
@@ -1,54 +1,112 @@
-from PyQt6.QtCore import QAbstractTableModel, Qt
+import math
+from typing import NamedTuple
+
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer
 from PyQt6.QtGui import QColor
 
 from package.enums.latencyenum import LatencyEnum
+from package.utils.utils import format_ms, format_percentage
+
+HEADERS = ["Name", "Address", "Game", "Players", "Map", "Ping", "Jitter", "Ping p95", "Loss"]
+# Optional columns with the rolling latency statistics, hidden by default
+LATENCY_STATS_COLUMNS = [6, 7, 8]
+# Delay before re-sorting the table after a server changed a sorted column, so bursts of updates sort once
+RESORT_DELAY_MS = 250
+
+RED = QColor(Qt.GlobalColor.red)
+YELLOW = QColor(Qt.GlobalColor.yellow)
+# Qt has no orange global color, use the SVG color name
+ORANGE = QColor("orange")
+DARK_GREEN = QColor(Qt.GlobalColor.darkGreen)
+
+
+def _ping_sort_key(ping):
+    # Timeouts and unmeasured servers go after every measured ping
+    return ping if ping >= 0 else math.inf
+
+
+def _nan_sort_key(value):
+    return math.inf if math.isnan(value) else value
+
+
+def _ping_color(server):
+    if server.ping == LatencyEnum.TIMEOUT:
+        return RED
+    elif server.ping > 140:
+        return ORANGE
+    elif server.ping > 50:
+        return YELLOW
+    return None
+
+
+def _players_color(server):
+    if server.max_players - server.reserved_slots <= server.player_count:
+        return RED
+    elif server.player_count > 0:
+        return DARK_GREEN
+    return None
+
+
+class Row(NamedTuple):
+    """
+    Everything the table shows for a server, computed once when the server changes
+    """
+    address: str
+    display: tuple
+    foreground: tuple
+    sort_keys: tuple
+
+
+def build_row(server) -> Row:
+    """
+    Compute the display values, colors and sort keys of a server row
+    :param server: GameServer
+    :return: Row
+    """
+    stats = server.latency_stats
+    jitter = stats.jitter
+    p95 = stats.percentile(95)
+    loss = stats.loss_rate()
+
+    return Row(
+        address=str(server),
+        display=(server.name, str(server), server.game, f"{server.player_count} / {server.max_players}",
+                 server.map_name, server.display_ping_in_ms(), format_ms(jitter), format_ms(p95),
+                 format_percentage(loss)),
+        foreground=(None, None, None, _players_color(server), None, _ping_color(server), None, None, None),
+        sort_keys=(server.name or "", (server.ip, server.port), server.game or "", server.player_count,
+                   server.map_name or "", _ping_sort_key(server.ping), _nan_sort_key(jitter), _nan_sort_key(p95),
+                   _nan_sort_key(loss)),
+    )
 
 
 class ServerTableModel(QAbstractTableModel):
     def __init__(self, data):
         super(ServerTableModel, self).__init__()
-        self._data = data
+        self._rows = [build_row(server) for server in data]
+        self._row_of = {row.address: i for i, row in enumerate(self._rows)}
+        self._sort_column = None
+        self._sort_order = Qt.SortOrder.AscendingOrder
+        self._resort_pending = False
 
     def rowCount(self, parent=None):
-        return len(self._data)
+        return len(self._rows)
 
     def columnCount(self, parent=None):
-        return 6
+        return len(HEADERS)
 
     def data(self, index, role=Qt.ItemDataRole.DisplayRole):
         if not index.isValid():
             return None
 
-        server = self._data[index.row()]
+        row = self._rows[index.row()]
 
         if role == Qt.ItemDataRole.DisplayRole:
-            if index.column() == 0:
-                return server.name
-            elif index.column() == 1:
-                return str(server)
-            elif index.column() == 2:
-                return server.game
-            elif index.column() == 3:
-                return f"{server.player_count} / {server.max_players}"
-            elif index.column() == 4:
-                return server.map_name
-            elif index.column() == 5:
-                return server.display_ping_in_ms()
+            return row.display[index.column()]
         elif role == Qt.ItemDataRole.UserRole:
-            return str(server)
+            return row.address
         elif role == Qt.ItemDataRole.ForegroundRole:
-            if index.column() == 5:
-                if server.ping == LatencyEnum.TIMEOUT:
-                    return QColor(Qt.GlobalColor.red)
-                elif server.ping > 50:
-                    return QColor(Qt.GlobalColor.yellow)
-                elif server.ping > 140:
-                    return QColor(Qt.GlobalColor.orange)
-            elif index.column() == 3:
-                if server.max_players - server.reserved_slots <= server.player_count:
-                    return QColor(Qt.GlobalColor.red)
-                elif server.player_count > 0:
-                    return QColor(Qt.GlobalColor.darkGreen)
+            return row.foreground[index.column()]
 
         return None
 
@@ -57,12 +115,64 @@ class ServerTableModel(QAbstractTableModel):
             return None
 
         if orientation == Qt.Orientation.Horizontal:
-            headers = ["Name", "Address", "Game", "Players", "Map", "Ping"]
-            return headers[section]
+            return HEADERS[section]
         return None
 
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        # Remember the sort, so it's kept when the data is replaced
+        self._sort_column = column if column >= 0 else None
+        self._sort_order = order
+
+        self._change_layout()
+
     def update_all_data(self, new_data):
-        # Update the entire data
+        # Update the entire data, reusing the rows of the servers that were already in the table
+        self._change_layout([self._rows[i] if (i := self._row_of.get(str(server))) is not None else build_row(server)
+                             for server in new_data])
+
+    def update_server(self, server):
+        # Update the row of a single server
+        i = self._row_of.get(str(server))
+        if i is None:
+            return
+
+        old_row = self._rows[i]
+        self._rows[i] = build_row(server)
+        self.dataChanged.emit(self.index(i, 0), self.index(i, self.columnCount() - 1))
+
+        if self._sort_column is not None and old_row.sort_keys[self._sort_column] != \
+                self._rows[i].sort_keys[self._sort_column]:
+            self._schedule_resort()
+
+    def _schedule_resort(self):
+        if self._resort_pending:
+            return
+        self._resort_pending = True
+        QTimer.singleShot(RESORT_DELAY_MS, self._resort)
+
+    def _resort(self):
+        self._resort_pending = False
+        self._change_layout()
+
+    def _change_layout(self, rows=None):
+        # Replace and/or re-sort the rows, moving the persistent indexes (selection, current index) with their
+        # servers, so they don't end up pointing at whichever server took the row
         self.layoutAboutToBeChanged.emit()
-        self._data = new_data
+        old_indexes = self.persistentIndexList()
+        old_cells = [(self._rows[index.row()].address, index.column()) for index in old_indexes]
+
+        if rows is not None:
+            self._rows = rows
+        self._sort_rows()
+
+        new_indexes = [self.index(self._row_of[address], column) if address in self._row_of else QModelIndex()
+                       for address, column in old_cells]
+        self.changePersistentIndexList(old_indexes, new_indexes)
         self.layoutChanged.emit()
+
+    def _sort_rows(self):
+        if self._sort_column is not None:
+            column = self._sort_column
+            self._rows.sort(key=lambda row: row.sort_keys[column],
+                            reverse=self._sort_order == Qt.SortOrder.DescendingOrder)
+        self._row_of = {row.address: i for i, row in enumerate(self._rows)}
@@ -0,0 +1,192 @@
+import math
+
+# Export formats, by file extension
+FORMATS = {".jsonl": "jsonl", ".csv": "csv", ".parquet": "parquet"}
+# Compressions, by file extension
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+# Columns of the CSV and Parquet exports. The histories are nested, so they are written as JSON in CSV.
+COLUMNS = ["address", "name", "game", "map_name", "player_count", "max_players", "ping", "password", "vac",
+           "last_refresh", "query_delay", "jitter", "ping_p50", "ping_p95", "ping_p99", "loss", "latency_history",
+           "players"]
+# Rows per Parquet row group, the only rows kept in memory while exporting
+PARQUET_BATCH_SIZE = 1024
+
+
+def _finite(value):
+    # NaN is not valid JSON, and is empty in CSV
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def iter_records(servers):
+    """
+    Generate the export record of each server, one at a time
+    :param servers:  iterable of GameServer
+    :return:  generator of dict records
+    """
+    for server in servers:
+        stats = server.latency_stats
+        yield {
+            "address": str(server),
+            "name": server.name,
+            "game": server.game,
+            "map_name": server.map_name,
+            "player_count": server.player_count,
+            "max_players": server.max_players,
+            "ping": server.ping,
+            "password": server.password,
+            "vac": server.vac,
+            "last_refresh": server.last_refresh,
+            "query_delay": server.query_delay,
+            "jitter": _finite(stats.jitter),
+            "ping_p50": _finite(stats.percentile(50)),
+            "ping_p95": _finite(stats.percentile(95)),
+            "ping_p99": _finite(stats.percentile(99)),
+            "loss": _finite(stats.loss_rate()),
+            "latency_history": list(server.latency_history),
+            "players": [{"name": player.name, "score": player.score, "duration": player.duration}
+                        for player in server.players],
+        }
+
+
+def guess_format(path) -> tuple[str, str]:
+    """
+    Get the export format and compression from the file name, e.g. servers.jsonl.gz
+    :param path:  str file path
+    :return:  tuple (format, compression or None)
+    """
+    import os
+
+    root, extension = os.path.splitext(path.lower())
+    compression = COMPRESSIONS.get(extension)
+    if compression:
+        root, extension = os.path.splitext(root)
+    if extension not in FORMATS:
+        raise ValueError(f"Unknown export format: {extension or path}, use one of {', '.join(FORMATS)}")
+    return FORMATS[extension], compression
+
+
+def open_output(path, compression):
+    """
+    Open a text file for writing, compressing it on the fly
+    :param path:  str file path
+    :param compression:  str "gzip", "zstd" or None
+    :return:  text file object
+    """
+    if compression == "gzip":
+        import gzip
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    if compression == "zstd":
+        import io
+
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression needs the zstandard package: pip install zstandard")
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, "wb")), encoding="utf-8",
+                                newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def write_jsonl(records, file) -> int:
+    """
+    Write the records as JSON Lines
+    :param records:  iterable of dict records
+    :param file:  text file object
+    :return:  int number of records written
+    """
+    import json
+
+    count = 0
+    for record in records:
+        file.write(json.dumps(record, ensure_ascii=False))
+        file.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(records, file) -> int:
+    """
+    Write the records as CSV, with the histories as JSON
+    :param records:  iterable of dict records
+    :param file:  text file object
+    :return:  int number of records written
+    """
+    import csv
+    import json
+
+    writer = csv.DictWriter(file, fieldnames=COLUMNS)
+    writer.writeheader()
+    count = 0
+    for record in records:
+        record["latency_history"] = json.dumps(record["latency_history"])
+        record["players"] = json.dumps(record["players"], ensure_ascii=False)
+        writer.writerow(record)
+        count += 1
+    return count
+
+
+def write_parquet(records, path, compression) -> int:
+    """
+    Write the records as Parquet, a row group at a time. Parquet compresses the columns itself.
+    :param records:  iterable of dict records
+    :param path:  str file path
+    :param compression:  str "gzip", "zstd" or None
+    :return:  int number of records written
+    """
+    import itertools
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export needs the pyarrow package: pip install pyarrow")
+
+    schema = pyarrow.schema([
+        ("address", pyarrow.string()),
+        ("name", pyarrow.string()),
+        ("game", pyarrow.string()),
+        ("map_name", pyarrow.string()),
+        ("player_count", pyarrow.int32()),
+        ("max_players", pyarrow.int32()),
+        ("ping", pyarrow.int32()),
+        ("password", pyarrow.bool_()),
+        ("vac", pyarrow.bool_()),
+        ("last_refresh", pyarrow.float64()),
+        ("query_delay", pyarrow.float64()),
+        ("jitter", pyarrow.float64()),
+        ("ping_p50", pyarrow.float64()),
+        ("ping_p95", pyarrow.float64()),
+        ("ping_p99", pyarrow.float64()),
+        ("loss", pyarrow.float64()),
+        ("latency_history", pyarrow.list_(pyarrow.int32())),
+        ("players", pyarrow.list_(pyarrow.struct([("name", pyarrow.string()), ("score", pyarrow.int32()),
+                                                  ("duration", pyarrow.float64())]))),
+    ])
+
+    count = 0
+    records = iter(records)
+    with pyarrow.parquet.ParquetWriter(path, schema, compression=compression or "none") as writer:
+        while batch := list(itertools.islice(records, PARQUET_BATCH_SIZE)):
+            writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def export_servers(servers, path) -> int:
+    """
+    Export the servers to a file, streaming the records so memory doesn't grow with the number of servers. The format
+    and compression are taken from the file name: .jsonl, .csv or .parquet, optionally followed by .gz or .zst.
+    :param servers:  iterable of GameServer
+    :param path:  str file path
+    :return:  int number of servers exported
+    """
+    export_format, compression = guess_format(path)
+    records = iter_records(servers)
+
+    if export_format == "parquet":
+        return write_parquet(records, path, compression)
+
+    with open_output(path, compression) as file:
+        if export_format == "csv":
+            return write_csv(records, file)
+        return write_jsonl(records, file)
@@ -0,0 +1,85 @@
+import threading
+import time
+
+
+class _Call:
+    """
+    A call in flight, which other callers of the same key wait for
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls by key: while a call for a key is in flight, other callers of the same key wait for
+    it and share its result. Results are also cached for a short time, so a call right after another one returns the
+    same result without running again.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._calls = dict[str, _Call]()
+        # Key -> (timestamp, result), oldest first
+        self._results = dict[str, tuple[float, object]]()
+
+    def do(self, key, fn) -> tuple[object, bool]:
+        """
+        Run fn for the given key, unless a call for the key is in flight or finished less than ttl seconds ago
+        :param key:  str key
+        :param fn:  function without arguments
+        :return:  tuple (result, shared), shared is False only for the caller that actually ran fn
+        """
+        with self._lock:
+            cached = self._results.get(key)
+            if cached:
+                if time.monotonic() - cached[0] < self.ttl:
+                    return cached[1], True
+                del self._results[key]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None:
+                    self._store(key, call.result)
+            call.done.set()
+
+        return call.result, False
+
+    def _store(self, key, result) -> None:
+        """
+        Cache the result of a call, dropping the expired results so keys that are never called again don't pile up.
+        Must be called with the lock held.
+        :param key:  str key
+        :param result:  result of the call
+        :return:
+        """
+        now = time.monotonic()
+        # Reinsert the key at the end, so the results stay ordered by timestamp and the expired ones are at the start
+        self._results.pop(key, None)
+        while self._results:
+            old_key = next(iter(self._results))
+            if now - self._results[old_key][0] < self.ttl:
+                break
+            del self._results[old_key]
+        self._results[key] = (now, result)
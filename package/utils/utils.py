@@ -1,3 +1,4 @@
+import math
 from typing import Any
 
 from platformdirs import user_config_dir
@@ -17,6 +18,24 @@ def float_to_hhmmss(seconds):
     return f"{hours:02}:{minutes:02}:{seconds:02}"
 
 
+def format_ms(value) -> str:
+    """
+    Format a latency value in milliseconds with 1 decimal, or N/A if it's not available
+    :param value:  float ms, may be NaN
+    :return:  str "value ms"
+    """
+    return "N/A" if math.isnan(value) else f"{value:.1f} ms"
+
+
+def format_percentage(value) -> str:
+    """
+    Format a percentage with 1 decimal, or N/A if it's not available
+    :param value:  float percentage, may be NaN
+    :return:  str "value %"
+    """
+    return "N/A" if math.isnan(value) else f"{value:.1f} %"
+
+
 def get_config_folder():
     """
     Get the configuration folder for the application.
@@ -33,28 +52,41 @@ def get_db_file_path() -> str:
     return user_config_dir(APP_NAME_LOWER, appauthor=False) + "/pysw.data"
 
 
-def get_db_file() -> Any:
+def get_list_file_path(name) -> str:
+    """
+    Get the path to the file of a server list other than the default one.
+    :param name:  str list name
+    :return:  str path to the list file
+    """
+    from urllib.parse import quote
+
+    return get_config_folder() + "/lists/" + quote(name, safe="") + ".data"
+
+
+def get_db_file(file_path=None) -> Any:
     """
     Get the database file.
+    :param file_path:  str path to the file, the default database file if None
     :return:  Any data
     """
     import pickle
     import os
 
-    file_path = get_db_file_path()
+    file_path = file_path or get_db_file_path()
     return pickle.load(open(file_path, "rb")) if os.path.exists(file_path) else None
 
 
-def save_to_db_file(data) -> None:
+def save_to_db_file(data, file_path=None) -> None:
     """
     Save data to the database file.
     :param data: Any data
+    :param file_path:  str path to the file, the default database file if None
     :return:
     """
     import pickle
     import os
 
-    file_path = get_db_file_path()
+    file_path = file_path or get_db_file_path()
 
     if not os.path.exists(os.path.dirname(file_path)):
         os.makedirs(os.path.dirname(file_path))
@@ -0,0 +1,30 @@
+import unittest
+
+from package.models.aggregates import FILL_RATE_BUCKETS, get_fill_bucket
+
+
+class FillBucketTest(unittest.TestCase):
+    def assertBucket(self, player_count, max_players, bucket):
+        self.assertEqual(FILL_RATE_BUCKETS[get_fill_bucket(player_count, max_players)], bucket)
+
+    def test_exact_quarters_are_in_the_lower_range(self):
+        self.assertBucket(8, 32, "1-25%")
+        self.assertBucket(16, 32, "26-50%")
+        self.assertBucket(10, 20, "26-50%")
+        self.assertBucket(24, 32, "51-75%")
+
+    def test_ranges(self):
+        self.assertBucket(0, 32, "Empty")
+        self.assertBucket(1, 32, "1-25%")
+        self.assertBucket(9, 32, "26-50%")
+        self.assertBucket(17, 32, "51-75%")
+        self.assertBucket(31, 32, "76-99%")
+        self.assertBucket(32, 32, "Full")
+        self.assertBucket(40, 32, "Full")
+
+    def test_unknown_maximum(self):
+        self.assertIsNone(get_fill_bucket(5, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
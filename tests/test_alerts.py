@@ -0,0 +1,34 @@
+import unittest
+
+from package.enums.latencyenum import LatencyEnum
+from package.models.alerts import AlertEngine
+from package.models.gameserver import GameServer
+
+
+class PingRuleTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = AlertEngine([{"name": "Low ping", "when": [["ping", "<", 50]]}])
+        self.events = []
+        self.engine.on_alert(lambda *event: self.events.append(event))
+
+    def evaluate(self, ping):
+        server = GameServer("127.0.0.1:27015")
+        server.ping = ping
+        self.engine.update(server)
+        self.engine.tick()
+
+    def test_measured_ping_matches(self):
+        self.evaluate(20)
+        self.assertEqual(self.events, [("FIRED", "Low ping", "127.0.0.1:27015")])
+
+    def test_timed_out_server_does_not_match(self):
+        self.evaluate(LatencyEnum.TIMEOUT)
+        self.assertEqual(self.events, [])
+
+    def test_new_server_does_not_match(self):
+        self.evaluate(GameServer("127.0.0.1:27015").ping)
+        self.assertEqual(self.events, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
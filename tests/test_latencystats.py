@@ -0,0 +1,92 @@
+import math
+import random
+import unittest
+
+from package.enums.latencyenum import LatencyEnum
+from package.models.latencystats import LOSS_WINDOW, LatencyStats, P2Quantile
+
+
+class P2QuantileTest(unittest.TestCase):
+    def test_no_samples(self):
+        self.assertTrue(math.isnan(P2Quantile(0.5).value()))
+
+    def test_fewer_than_five_samples(self):
+        # The exact samples are kept until there are five, the estimate is the nearest rank
+        quantiles = {p: P2Quantile(p) for p in (0.5, 0.95)}
+        for x in (40, 10, 30, 20):
+            for quantile in quantiles.values():
+                quantile.add(x)
+        self.assertEqual(quantiles[0.5].heights, [10, 20, 30, 40])
+        self.assertEqual(quantiles[0.5].value(), 30)
+        self.assertEqual(quantiles[0.95].value(), 40)
+
+        single = P2Quantile(0.95)
+        single.add(25)
+        self.assertEqual(single.value(), 25)
+
+    def test_converges_on_uniform_distribution(self):
+        rng = random.Random(42)
+        samples = [rng.uniform(0, 1000) for _ in range(20000)]
+        for p in (0.5, 0.95, 0.99):
+            quantile = P2Quantile(p)
+            for x in samples:
+                quantile.add(x)
+            exact = sorted(samples)[int(p * len(samples))]
+            with self.subTest(p=p):
+                self.assertAlmostEqual(quantile.value(), exact, delta=10)
+
+    def test_converges_on_exponential_distribution(self):
+        rng = random.Random(7)
+        samples = [rng.expovariate(1 / 50) for _ in range(20000)]
+        quantile = P2Quantile(0.95)
+        for x in samples:
+            quantile.add(x)
+        exact = sorted(samples)[int(0.95 * len(samples))]
+        self.assertAlmostEqual(quantile.value(), exact, delta=exact * 0.03)
+
+    def test_markers_stay_ordered(self):
+        rng = random.Random(1)
+        quantile = P2Quantile(0.99)
+        for _ in range(5000):
+            quantile.add(rng.choice((5, 20, 20, 300)))
+            self.assertEqual(quantile.heights, sorted(quantile.heights))
+            self.assertEqual(quantile.positions, sorted(quantile.positions))
+
+
+class LossWindowTest(unittest.TestCase):
+    def test_no_queries(self):
+        self.assertTrue(math.isnan(LatencyStats().loss_rate()))
+
+    def test_partial_window(self):
+        stats = LatencyStats()
+        for ping in (20, LatencyEnum.TIMEOUT, 20, 20):
+            stats.add(ping)
+        self.assertEqual(stats.loss_rate(), 25)
+
+    def test_window_wraps(self):
+        stats = LatencyStats()
+        # A full window of timeouts, then answers push them out one at a time
+        for _ in range(LOSS_WINDOW):
+            stats.add(LatencyEnum.TIMEOUT)
+        self.assertEqual(stats.loss_rate(), 100)
+
+        for _ in range(LOSS_WINDOW // 4):
+            stats.add(20)
+        self.assertEqual(stats.loss_rate(), 75)
+
+        for _ in range(LOSS_WINDOW * 2):
+            stats.add(20)
+        self.assertEqual(stats.loss_rate(), 0)
+
+        stats.add(LatencyEnum.TIMEOUT)
+        self.assertEqual(stats.loss_rate(), 100 / LOSS_WINDOW)
+
+    def test_unmeasured_ping_is_not_a_loss(self):
+        stats = LatencyStats()
+        stats.add(LatencyEnum.NOT_MEASURED)
+        self.assertEqual(stats.loss_rate(), 0)
+        self.assertEqual(stats.count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
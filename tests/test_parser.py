@@ -0,0 +1,78 @@
+import io
+import unittest
+
+from a2s.byteio import ByteReader
+from a2s.defaults import DEFAULT_ENCODING
+from a2s.exceptions import BrokenMessageError
+from a2s.info import InfoProtocol
+from a2s.players import PlayersProtocol
+
+from package.network.parser import PLAYER, Player, ServerInfo, parse_info, parse_players
+
+SOURCE_INFO = (b"\x49\x11Sample Server \xe2\x98\x85\0de_dust2\0cstrike\0Counter-Strike: Source\0"
+               b"\xf0\x00\x12\x20\x00dl\x00\x01" b"1.0.0.0\0" b"\xa0\x87\x69" b"tags,here\0")
+GOLDSRC_INFO_HEAD = b"\x6d127.0.0.1:27015\0Old Server\0crossfire\0valve\0Half-Life\0\x05\x10\x2fdl"
+GOLDSRC_INFO_MOD = (GOLDSRC_INFO_HEAD + b"\x01\x01" b"http://mod\0http://dl\0\0" b"\x01\0\0\0\x00\x10\0\0\x01\x00"
+                    b"\x01\x00")
+GOLDSRC_INFO_NO_MOD = GOLDSRC_INFO_HEAD + b"\x00\x00" b"\x01\x00"
+PLAYERS = b"\x44\x40" + b"".join(b"\0" + f"Player {i} é".encode() + b"\0" + PLAYER.pack(i * 7, i * 13.25)
+                                 for i in range(64))
+
+
+def a2s_parse(data, protocol):
+    reader = ByteReader(io.BytesIO(data), endian="<", encoding=DEFAULT_ENCODING)
+    return protocol.deserialize_response(reader, reader.read_uint8(), 0.05)
+
+
+class ParseInfoTest(unittest.TestCase):
+    def assertSameAsA2s(self, data):
+        expected = a2s_parse(data, InfoProtocol)
+        self.assertEqual(parse_info(data, 0.05),
+                         ServerInfo(*(getattr(expected, field) for field in ServerInfo._fields)))
+
+    def test_source(self):
+        self.assertSameAsA2s(SOURCE_INFO)
+
+    def test_goldsrc_with_mod(self):
+        self.assertSameAsA2s(GOLDSRC_INFO_MOD)
+
+    def test_goldsrc_without_mod(self):
+        self.assertSameAsA2s(GOLDSRC_INFO_NO_MOD)
+
+    def test_truncated(self):
+        # The fields after the VAC flag are not parsed, so only cut before it
+        source_vac = SOURCE_INFO.index(b"dl\x00\x01") + 3
+        goldsrc_vac = len(GOLDSRC_INFO_MOD) - 2
+        for data, vac in ((SOURCE_INFO, source_vac), (GOLDSRC_INFO_MOD, goldsrc_vac)):
+            for length in (1, 10, vac // 2, vac):
+                with self.subTest(data=data[:1], length=length):
+                    with self.assertRaises(BrokenMessageError):
+                        parse_info(data[:length], 0.05)
+
+    def test_truncated_in_mod_section(self):
+        with self.assertRaises(BrokenMessageError):
+            parse_info(GOLDSRC_INFO_MOD[:GOLDSRC_INFO_MOD.index(b"http://dl") + 4], 0.05)
+
+    def test_invalid_response_type(self):
+        with self.assertRaises(BrokenMessageError):
+            parse_info(b"\x41" + SOURCE_INFO[1:], 0.05)
+
+
+class ParsePlayersTest(unittest.TestCase):
+    def test_players(self):
+        expected = a2s_parse(PLAYERS, PlayersProtocol)
+        self.assertEqual(parse_players(PLAYERS),
+                         [Player(player.name, player.score, player.duration) for player in expected])
+
+    def test_no_players(self):
+        self.assertEqual(parse_players(b"\x44\x00"), [])
+
+    def test_truncated(self):
+        for length in (3, 10, len(PLAYERS) // 2, len(PLAYERS) - 1):
+            with self.subTest(length=length):
+                with self.assertRaises(BrokenMessageError):
+                    parse_players(PLAYERS[:length])
+
+
+if __name__ == "__main__":
+    unittest.main()
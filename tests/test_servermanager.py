@@ -0,0 +1,70 @@
+import threading
+import unittest
+
+from package.models.gameserver import GameServer
+from package.models.servermanager import ServerManager
+from package.network.parser import Player
+
+
+class RemoveWhileRefreshingTest(unittest.TestCase):
+    def setUp(self):
+        self.manager = ServerManager.from_addresses([])
+        self.server = GameServer("127.0.0.1:27015")
+        self.manager.add_server(self.server)
+
+    def tearDown(self):
+        self.manager.close()
+
+    def refresh_removing_server(self):
+        # Simulate a query that finishes after the server was removed from the list
+        players = [Player("bob", 1, 10.0)]
+        self.manager.remove_server(str(self.server))
+        self.server.game, self.server.map_name, self.server.player_count, self.server.max_players = \
+            "cstrike", "de_dust2", 18, 32
+        return {"player_count": (0, 18), "players": (self.server.players, players)}
+
+    def test_removed_server_is_not_indexed(self):
+        self.server.refresh = self.refresh_removing_server
+        self.manager._refresh_and_notify(self.server)
+
+        self.assertEqual(self.manager.servers, {})
+        self.assertEqual(self.manager.search_players("bob"), [])
+        summary = self.manager.get_summary()
+        self.assertEqual(summary["servers"], 0)
+        self.assertEqual(summary["total_players"], 0)
+        self.assertEqual(summary["players_per_map"], {})
+
+    def test_removed_server_is_not_counted_after_concurrent_refresh(self):
+        # A refresh finishing while the server is being removed must not count it in the totals. The removal runs in
+        # another thread right before the refresh counts the server, and is given the time to finish if it can.
+        aggregates_update = self.manager.aggregates.update
+        remover = threading.Thread(target=self.manager.remove_server, args=(str(self.server),))
+
+        def update_while_removing(server):
+            remover.start()
+            remover.join(0.2)
+            aggregates_update(server)
+
+        self.manager.aggregates.update = update_while_removing
+        self.server.player_count, self.server.max_players = 18, 32
+        self.manager._notify_changes(self.server, {"player_count": (0, 18)})
+        remover.join()
+        self.manager.aggregates.update = aggregates_update
+
+        summary = self.manager.get_summary()
+        self.assertEqual(summary["servers"], 0)
+        self.assertEqual(summary["total_players"], 0)
+        self.assertEqual(summary["fill_distribution"]["51-75%"], 0)
+
+    def test_removed_server_players_are_not_searchable(self):
+        # The players may change between the query and the removal, all the indexed ones are removed
+        self.manager._notify_changes(self.server, {"players": ([], [Player("alice", 0, 1.0)])})
+        self.server.players = [Player("bob", 0, 1.0)]
+        self.manager.remove_server(str(self.server))
+
+        self.assertEqual(self.manager.search_players("alice"), [])
+        self.assertEqual(self.manager.search_players("bob"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()